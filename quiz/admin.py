@@ -1,6 +1,17 @@
+import time
+
+from django.conf.urls import patterns, url
 from django.contrib import admin
-from quiz.models import Quiz, Category, Question, Answer
-from forms import QuizAdminForm
+from django.core.exceptions import PermissionDenied
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse, HttpResponseRedirect
+from django.shortcuts import render
+from quiz.analysis import analyse_quiz
+from quiz.export import export_results
+from quiz.importer import import_bank, describe
+from quiz.models import Quiz, Category, Question, Answer, QuestionStats, \
+    QuizStats
+from forms import QuizAdminForm, QuestionImportForm
 
 
 class QuestionInline(admin.TabularInline):
@@ -10,14 +21,87 @@ class QuestionInline(admin.TabularInline):
 
 class AnswerInline(admin.TabularInline):
     model = Answer
+    readonly_fields = ('selection_rate',)
+
+    def get_queryset(self, request):
+        return super(AnswerInline, self).get_queryset(request) \
+            .prefetch_related('answerstats_set')
+
+    def selection_rate(self, answer):
+        """
+        How often the answer was chosen, in each quiz analysed
+        """
+        return ', '.join('%.0f%%' % (100 * stats.rate)
+                         for stats in answer.answerstats_set.all()) or '-'
 
 
 class QuizAdmin(admin.ModelAdmin):
     form = QuizAdminForm
 
-    list_display = ('title', 'category',)
+    list_display = ('title', 'category', 'question_count', 'results',)
     list_filter = ('category',)
     search_fields = ('description', 'category',)
+    actions = ['item_analysis', 'export_csv', 'export_csv_gzip',
+               'export_jsonl_gzip']
+
+    def get_queryset(self, request):
+        return super(QuizAdmin, self).get_queryset(request) \
+            .select_related('stats')
+
+    def results(self, quiz):
+        """
+        The number of completed sittings and their mean score
+        """
+        try:
+            stats = quiz.stats
+        except QuizStats.DoesNotExist:
+            return '-'
+        if not stats.attempts:
+            return '-'
+        return '%d, mean %.0f%%' % (stats.attempts, stats.mean())
+
+    def item_analysis(self, request, queryset):
+        """
+        Computes the statistics of the questions of the selected quizzes
+        """
+        try:
+            for quiz in queryset:
+                sittings = analyse_quiz(quiz)
+                self.message_user(request, 'Analysed %d sittings of "%s"'
+                                  % (sittings, quiz))
+        except ImportError as e:
+            self.message_user(request, str(e), level='error')
+    item_analysis.short_description = 'Compute the item analysis'
+
+    def export(self, queryset, format, compress):
+        """
+        Streams the results of the selected quizzes as a download
+        """
+        quiz_ids = list(queryset.values_list('id', flat=True))
+        filename = 'results.%s' % format
+        content_type = 'text/csv' if format == 'csv' else 'application/json'
+        if compress:
+            filename += '.gz'
+            content_type = 'application/gzip'
+        response = StreamingHttpResponse(
+            export_results(quiz_ids, format, compress),
+            content_type=content_type)
+        response['Content-Disposition'] = \
+            'attachment; filename="%s"' % filename
+        return response
+
+    def export_csv(self, request, queryset):
+        return self.export(queryset, 'csv', False)
+    export_csv.short_description = 'Export the results as CSV'
+
+    def export_csv_gzip(self, request, queryset):
+        return self.export(queryset, 'csv', True)
+    export_csv_gzip.short_description = 'Export the results as gzipped CSV'
+
+    def export_jsonl_gzip(self, request, queryset):
+        return self.export(queryset, 'jsonl', True)
+    export_jsonl_gzip.short_description = \
+        'Export the results as gzipped JSON lines'
 
 
 class CategoryAdmin(admin.ModelAdmin):
@@ -25,7 +109,7 @@ class CategoryAdmin(admin.ModelAdmin):
 
 
 class QuestionAdmin(admin.ModelAdmin):
-    list_display = ('content', 'category',)
+    list_display = ('content', 'category', 'item_statistics',)
     list_filter = ('category',)
     fields = ('content', 'category', 'quiz', 'explanation',)
 
@@ -34,7 +118,78 @@ class QuestionAdmin(admin.ModelAdmin):
 
     inlines = [AnswerInline]
 
+    def get_queryset(self, request):
+        return super(QuestionAdmin, self).get_queryset(request) \
+            .prefetch_related(Prefetch(
+                'questionstats_set',
+                queryset=QuestionStats.objects.select_related('quiz')))
+
+    def item_statistics(self, question):
+        """
+        The p-value and discrimination of the question in each quiz
+        analysed
+        """
+        statistics = []
+        for stats in question.questionstats_set.all():
+            if stats.discrimination is None:
+                discrimination = '-'
+            else:
+                discrimination = '%.2f' % stats.discrimination
+            statistics.append('%s: p %.2f, r %s' % (
+                stats.quiz, stats.p_value, discrimination))
+        return '; '.join(statistics) or '-'
+
+    def get_urls(self):
+        return patterns(
+            '',
+            url(r'^import/$', self.admin_site.admin_view(self.import_view),
+                name='quiz_question_import'),
+        ) + super(QuestionAdmin, self).get_urls()
+
+    def import_view(self, request):
+        """
+        Imports an uploaded question bank, see quiz.importer
+        """
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        if request.method == 'POST':
+            form = QuestionImportForm(request.POST, request.FILES)
+            if form.is_valid():
+                start = time.time()
+                dry_run = form.cleaned_data['dry_run']
+                counts = import_bank(form.cleaned_data['questions'],
+                                     dry_run=dry_run)
+                summary = describe(counts, time.time() - start)
+                if dry_run:
+                    self.message_user(request, 'Validated %s, nothing '
+                                      'imported' % summary)
+                else:
+                    self.message_user(request, 'Imported %s' % summary)
+                    return HttpResponseRedirect('../')
+        else:
+            form = QuestionImportForm()
+        return render(request, 'admin/quiz/question/import.html', {
+            'form': form,
+            'opts': self.model._meta,
+            'title': 'Import questions',
+        })
+
+
+class QuestionStatsAdmin(admin.ModelAdmin):
+    list_display = ('question', 'quiz', 'responses', 'p_value',
+                    'discrimination', 'computed',)
+    list_filter = ('quiz',)
+    list_select_related = ('question', 'quiz',)
+    search_fields = ('question__content',)
+    readonly_fields = ('question', 'quiz', 'responses', 'p_value',
+                       'discrimination', 'computed',)
+
+    def has_add_permission(self, request):
+        # computed by quiz_item_analysis
+        return False
+
 
 admin.site.register(Quiz, QuizAdmin)
 admin.site.register(Category, CategoryAdmin)
 admin.site.register(Question, QuestionAdmin)
+admin.site.register(QuestionStats, QuestionStatsAdmin)
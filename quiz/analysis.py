@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Item analysis of the questions of a quiz, from the responses of the
+sittings of the quiz which have ended (see Response.finished). Those of
+the sittings in progress or abandoned are left out, as their scores on
+the rest of the quiz are incomplete.
+
+For each question, its p-value is the proportion of correct answers and
+its discrimination is the point-biserial correlation between answering
+it correctly and the score on the other questions of the sitting. For
+each answer, its selection rate is the proportion of the responses to
+its question which chose it.
+
+The responses are read a chunk of sittings at a time into a sittings x
+questions matrix, from which only the sums the statistics are made of
+are kept, so that the memory used does not grow with the number of
+sittings. Requires NumPy.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# number of sittings read at once
+CHUNK_SIZE = 10000
+
+
+def _sitting_chunks(responses, chunk_size):
+    """
+    Yields the responses of chunk_size sittings at a time, as lists of
+    (sitting ID, question ID, answer ID, correct) tuples. Each chunk is
+    read with a range of sitting IDs, so that the responses are not all
+    fetched by the database driver at once.
+    """
+    last = 0
+    while True:
+        sitting_ids = list(responses.filter(sitting_id__gt=last)
+                           .order_by('sitting_id')
+                           .values_list('sitting_id', flat=True)
+                           .distinct()[:chunk_size])
+        if not sitting_ids:
+            return
+        yield list(responses.filter(sitting_id__gte=sitting_ids[0],
+                                    sitting_id__lte=sitting_ids[-1])
+                   .order_by()
+                   .values_list('sitting_id', 'question_id', 'answer_id',
+                                'correct'))
+        last = sitting_ids[-1]
+
+
+def analyse_quiz(quiz, chunk_size=CHUNK_SIZE):
+    """
+    Computes the item analysis of the quiz and replaces its QuestionStats
+    and AnswerStats. Returns the number of sittings analysed.
+    """
+    from quiz.models import Answer, Response, QuestionStats, AnswerStats
+    if numpy is None:
+        raise ImportError('The item analysis requires NumPy')
+
+    responses = Response.objects.filter(quiz_id=quiz.id, finished=True)
+    question_ids = sorted(responses.order_by().values_list(
+        'question_id', flat=True).distinct())
+    columns = dict((question_id, i)
+                   for i, question_id in enumerate(question_ids))
+    answers = list(Answer.objects.filter(question_id__in=question_ids)
+                   .values_list('id', 'question_id'))
+    answer_columns = dict((answer[0], i) for i, answer in enumerate(answers))
+
+    size = len(question_ids)
+    counts = numpy.zeros(size)
+    sum_x = numpy.zeros(size)
+    sum_rest = numpy.zeros(size)
+    sum_rest2 = numpy.zeros(size)
+    sum_x_rest = numpy.zeros(size)
+    selections = numpy.zeros(len(answers), dtype=numpy.int64)
+    sittings = 0
+
+    for chunk in _sitting_chunks(responses, chunk_size):
+        rows = {}
+        row, column, correct, chosen = [], [], [], []
+        for sitting_id, question_id, answer_id, is_correct in chunk:
+            row.append(rows.setdefault(sitting_id, len(rows)))
+            column.append(columns[question_id])
+            correct.append(is_correct)
+            if answer_id in answer_columns:
+                chosen.append(answer_columns[answer_id])
+
+        answered = numpy.zeros((len(rows), size), dtype=bool)
+        answered[row, column] = True
+        x = numpy.zeros((len(rows), size))
+        x[row, column] = correct
+        # the score of each sitting on the other questions
+        rest = (x.sum(axis=1)[:, numpy.newaxis] - x) * answered
+
+        counts += answered.sum(axis=0)
+        sum_x += x.sum(axis=0)
+        sum_rest += rest.sum(axis=0)
+        sum_rest2 += (rest * rest).sum(axis=0)
+        sum_x_rest += (x * rest).sum(axis=0)
+
+        selections += numpy.bincount(numpy.array(chosen, dtype=numpy.intp),
+                                     minlength=len(answers))
+        sittings += len(rows)
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        p_values = sum_x / counts
+        mean_rest = sum_rest / counts
+        covariance = sum_x_rest / counts - p_values * mean_rest
+        variance = p_values * (1 - p_values) * \
+            (sum_rest2 / counts - mean_rest * mean_rest)
+        discrimination = covariance / numpy.sqrt(variance)
+
+    now = timezone.now()
+    question_stats = []
+    for question_id, i in columns.items():
+        question_stats.append(QuestionStats(
+            quiz_id=quiz.id, question_id=question_id,
+            responses=int(counts[i]), p_value=float(p_values[i]),
+            discrimination=float(discrimination[i])
+            if numpy.isfinite(discrimination[i]) else None,
+            computed=now))
+    answer_stats = []
+    for i, (answer_id, question_id) in enumerate(answers):
+        total = counts[columns[question_id]]
+        answer_stats.append(AnswerStats(
+            quiz_id=quiz.id, answer_id=answer_id,
+            selections=int(selections[i]),
+            rate=float(selections[i] / total) if total else 0.0))
+
+    with transaction.atomic():
+        QuestionStats.objects.filter(quiz_id=quiz.id).delete()
+        AnswerStats.objects.filter(quiz_id=quiz.id).delete()
+        QuestionStats.objects.bulk_create(question_stats)
+        AnswerStats.objects.bulk_create(answer_stats)
+    return sittings
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+JSON API to take a quiz, for clients that fetch several questions at once
+and submit their answers in batches. It works on the same sittings as
+the pages of quiz.views.
+
+GET  take/<quiz_id>/questions/?offset=0&limit=10
+     the questions not answered yet, from the offset-th one
+POST take/<quiz_id>/answers/
+     {"answers": [{"question": 1, "answer": 4}, ...]}, the answers to the
+     questions from the first one not answered yet, in order
+GET  take/<quiz_id>/result/
+     the result of the current sitting, or of the last complete one
+
+The user is authenticated by the session, and POST requests must carry
+the CSRF token like any other form of the site.
+"""
+import json
+from functools import wraps
+
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET, require_POST
+
+from quiz.buffer import load_buffered_answers, save_answers
+from quiz.content import get_quiz_content, shuffle_answers
+from quiz.models import Quiz, Sitting, Answer
+from quiz.views import complete_sitting
+
+# maximum number of questions returned at once
+MAX_LIMIT = 100
+
+
+def _error(status, message):
+    return JsonResponse({'error': message}, status=status)
+
+
+def api_view(view):
+    """
+    Returns a JSON error instead of redirecting to the login page, and
+    gives the view the content of the quiz instead of its ID
+    """
+    @wraps(view)
+    def wrapper(request, quiz_id, *args, **kwargs):
+        if not request.user.is_authenticated():
+            return _error(401, 'Authentication required')
+        try:
+            quiz = get_quiz_content(quiz_id)
+        except Quiz.DoesNotExist:
+            return _error(404, 'No such quiz')
+        return view(request, quiz, *args, **kwargs)
+    return wrapper
+
+
+def _question_data(question, sitting):
+    return {
+        'id': question.id,
+        'content': question.content,
+        'category': question.category,
+        'answers': [{'id': answer.id, 'content': answer.content}
+                    for answer in shuffle_answers(
+                        question.answers, question.id, sitting)],
+    }
+
+
+def _result_data(sitting, quiz):
+    data = {
+        'score': sitting.get_current_score(),
+        'max_score': sitting.max_score,
+        'percent': sitting.get_percent_correct(),
+        'complete': sitting.complete,
+    }
+    if sitting.complete and quiz.answers_at_end:
+        data['questions'] = [
+            {'id': result['question'].id,
+             'incorrect': result['user_was_incorrect'],
+             'correct_answers': [answer.id for answer in result['answers']
+                                 if answer.correct]}
+            for result in sitting.get_question_results()]
+    return data
+
+
+@require_GET
+@api_view
+def questions(request, quiz):
+    try:
+        offset = max(int(request.GET.get('offset', 0)), 0)
+        limit = min(int(request.GET.get('limit', MAX_LIMIT)), MAX_LIMIT)
+    except ValueError:
+        return _error(400, 'offset and limit must be integers')
+
+    sitting = Sitting.objects.get_or_create_sitting(request.user, quiz)
+    load_buffered_answers(sitting)
+    start = sitting.cursor + offset
+    question_ids = sitting.question_ids[start:start + max(limit, 0)]
+
+    return JsonResponse({
+        'quiz': {'id': quiz.id, 'title': quiz.title,
+                 'description': quiz.description},
+        'answered': sitting.cursor,
+        'remaining': len(sitting.question_ids) - sitting.cursor,
+        'questions': [_question_data(quiz.get_question(question_id), sitting)
+                      for question_id in question_ids],
+    })
+
+
+@require_POST
+@api_view
+def answers(request, quiz):
+    try:
+        submitted = [(int(answer['question']), int(answer['answer']))
+                     for answer in json.loads(
+                         request.body.decode('utf-8'))['answers']]
+    except (ValueError, KeyError, TypeError):
+        return _error(400, 'Expected {"answers": [{"question": <id>, '
+                           '"answer": <id>}, ...]}')
+
+    try:
+        sitting = Sitting.objects.get(
+            user=request.user, quiz_id=quiz.id, active=True)
+    except Sitting.DoesNotExist:
+        return _error(409, 'No quiz in progress')
+    load_buffered_answers(sitting)
+
+    # answers already recorded, sent again after a lost response,
+    # are skipped
+    question_ids = sitting.question_ids
+    answered = set(question_ids[:sitting.cursor])
+    submitted = [(question_id, answer_id)
+                 for question_id, answer_id in submitted
+                 if question_id not in answered]
+
+    expected = question_ids[sitting.cursor:sitting.cursor + len(submitted)]
+    if [question_id for question_id, answer_id in submitted] != \
+            list(expected):
+        return _error(409, 'The answers must be to the next questions, '
+                           'in order')
+
+    # answers which are not answers of the quiz as it is now, e.g. to a
+    # question removed from it since the sitting was started
+    stored = Answer.objects.in_bulk([
+        answer_id for question_id, answer_id in submitted
+        if quiz.get_answer(answer_id) is None])
+    graded = []
+    for question_id, answer_id in submitted:
+        answer = quiz.get_answer(answer_id)
+        if answer is None:
+            answer = stored.get(answer_id)
+        if answer is None or answer.question_id != question_id:
+            return _error(400, 'Answer %d is not an answer to question %d'
+                          % (answer_id, question_id))
+        graded.append(answer)
+
+    if graded and \
+            not save_answers(sitting, graded):
+        return _error(409, 'The answers have been submitted concurrently')
+
+    data = {
+        'recorded': len(graded),
+        'remaining': len(question_ids) - sitting.cursor,
+    }
+    if not quiz.answers_at_end:
+        data['answers'] = [{'question': answer.question_id,
+                            'answer': answer.id,
+                            'correct': answer.correct}
+                           for answer in graded]
+    if not sitting.get_next_question():
+        complete_sitting(sitting, quiz)
+        sitting.complete = True
+        data['result'] = _result_data(sitting, quiz)
+    return JsonResponse(data)
+
+
+@require_GET
+@api_view
+def result(request, quiz):
+    try:
+        sitting = Sitting.objects.get(
+            user=request.user, quiz_id=quiz.id, active=True)
+        load_buffered_answers(sitting)
+    except Sitting.DoesNotExist:
+        # only kept for exam papers
+        sittings = Sitting.objects.filter(
+            user=request.user, quiz_id=quiz.id, complete=True)
+        try:
+            sitting = sittings.order_by('-id')[0]
+        except IndexError:
+            return _error(404, 'This quiz has not been taken')
+    return JsonResponse(_result_data(sitting, quiz))
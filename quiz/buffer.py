@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Write-behind buffer of the answers given while taking a quiz.
+
+When QUIZ_ANSWER_BUFFER names one of the CACHES, the answers are not
+written to the sitting when they are given but added to that cache, and
+the quiz_flush_answers command writes them to the sittings in batches.
+The views read the buffered answers of a sitting back, so that users see
+their own answers straight away, and a sitting is flushed before it is
+completed. Without the setting, the answers are written to the sitting
+directly.
+
+The answer at each position of a sitting is stored under its own key, as
+a response (see Sitting.record_answers), added with cache.add so that an
+answer submitted twice is only buffered once. An end position for each
+sitting is kept under a key incremented before the answers are added, so
+that only the keys up to it are read, stopping at the first one missing.
+It may be past the last answer, when concurrent requests submit the same
+one or a request is interrupted, but never before it.
+A queue of the sittings with buffered answers tells the flusher which
+ones to write. The flusher keeps the position of the last entry of the
+queue written, and only moves it once the answers are committed, so that
+the answers are written again if it stops halfway. Writing the answers
+of a sitting is guarded on its cursor (see Sitting.record_answers), so
+writing them twice is harmless. The answers written by a flush are
+deleted by the next one, as requests may still read them in between, and
+another key of each sitting holds the position they have been deleted up
+to.
+
+The cache must be shared by all the processes and must not evict its
+entries (e.g. Redis with persistence), or answers would be lost.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+# name of the cache buffering the answers, None to write them directly
+ANSWER_BUFFER = getattr(settings, 'QUIZ_ANSWER_BUFFER', None)
+
+ANSWER_KEY = 'quiz:answer:%d:%d'
+END_KEY = 'quiz:answer_end:%d'
+DELETED_KEY = 'quiz:answer_deleted:%d'
+QUEUE_KEY = 'quiz:answer_queue:%d'
+QUEUE_HEAD_KEY = 'quiz:answer_queue_head'
+QUEUE_FLUSHED_KEY = 'quiz:answer_queue_flushed'
+
+
+def _buffer():
+    return caches[ANSWER_BUFFER]
+
+
+def _buffered_answers(buffer, sittings):
+    """
+    Returns a dict of the buffered responses of each sitting from its
+    cursor onwards, in order, read from the buffer in two calls
+    """
+    ends = buffer.get_many([END_KEY % sitting.id for sitting in sittings])
+    keys = dict((sitting.id, [ANSWER_KEY % (sitting.id, position)
+                              for position in range(
+                                  sitting.cursor,
+                                  min(ends.get(END_KEY % sitting.id, 0),
+                                      len(sitting.question_ids)))])
+                for sitting in sittings)
+    values = {}
+    if any(keys.values()):
+        values = buffer.get_many([key for sitting_keys in keys.values()
+                                  for key in sitting_keys])
+    answers = {}
+    for sitting_id, sitting_keys in keys.items():
+        answers[sitting_id] = []
+        for key in sitting_keys:
+            if key not in values:
+                break
+            answers[sitting_id].append(values[key])
+    return answers
+
+
+def load_buffered_answers(sitting):
+    """
+    Applies the buffered answers of the sitting to the instance, without
+    saving it, so that it shows the answers given so far
+    """
+    if ANSWER_BUFFER is None:
+        return
+    responses = _buffered_answers(_buffer(), [sitting])[sitting.id]
+    if responses:
+        (sitting.cursor, sitting.current_score, sitting.incorrect_bitset,
+         sitting.response_log) = sitting.answered(responses)
+
+
+def save_answers(sitting, answers):
+    """
+    Records the answers given to the questions from the cursor of the
+    sitting onwards, in the buffer or in the sitting. The buffered answers
+    of the sitting must have been loaded.
+    Returns True if the answers were recorded, False if they were stale,
+    like Sitting.record_answers.
+    """
+    answered = int(time.time())
+    responses = [(answer.id, answer.correct, answered) for answer in answers]
+    if ANSWER_BUFFER is None:
+        return sitting.record_answers(responses)
+
+    buffer = _buffer()
+    start = sitting.cursor
+    end = start + len(responses)
+    # the end is moved before the answers are added, so that an answer is
+    # never buffered past it, even if the request is interrupted. The
+    # first answers buffered for the sitting start at its cursor.
+    buffer.add(END_KEY % sitting.id, start, None)
+    moved = buffer.incr(END_KEY % sitting.id, len(responses))
+    if moved < end:
+        # left behind by answers written while they were not buffered
+        buffer.incr(END_KEY % sitting.id, end - moved)
+
+    added = 0
+    for position, response in enumerate(responses, start):
+        if not buffer.add(ANSWER_KEY % (sitting.id, position), response,
+                          None):
+            # answered by a concurrent request
+            break
+        added += 1
+
+    if added:
+        buffer.add(QUEUE_HEAD_KEY, 0, None)
+        buffer.set(QUEUE_KEY % buffer.incr(QUEUE_HEAD_KEY), sitting.id, None)
+        (sitting.cursor, sitting.current_score, sitting.incorrect_bitset,
+         sitting.response_log) = sitting.answered(responses[:added])
+    if added < len(responses):
+        load_buffered_answers(sitting)
+        return False
+    return True
+
+
+def _write(buffer, sitting_ids):
+    """
+    Writes the buffered answers of the sittings, in one transaction,
+    and returns the number of answers written
+    """
+    from quiz.models import Sitting
+    # the completed sittings have been flushed by flush_sitting
+    sittings = list(Sitting.objects.filter(
+        id__in=sitting_ids, active=True).only(
+        'id', 'question_order', 'cursor', 'current_score',
+        'incorrect_bitset', 'response_log'))
+    # the answers written by the previous flush, which no request reads
+    # any more
+    deleted = buffer.get_many([DELETED_KEY % sitting.id
+                               for sitting in sittings])
+    cursors = dict((DELETED_KEY % sitting.id, sitting.cursor)
+                   for sitting in sittings)
+    written_keys = [ANSWER_KEY % (sitting.id, position)
+                    for sitting in sittings
+                    for position in range(
+                        deleted.get(DELETED_KEY % sitting.id, 0),
+                        sitting.cursor)]
+
+    written = 0
+    answers = _buffered_answers(buffer, sittings)
+    with transaction.atomic():
+        for sitting in sittings:
+            responses = answers[sitting.id]
+            if responses and sitting.record_answers(responses):
+                written += len(responses)
+
+    buffer.delete_many(written_keys)
+    buffer.set_many(cursors, None)
+    return written
+
+
+def flush_sitting(sitting):
+    """
+    Writes the buffered answers of the sitting and removes them from the
+    buffer, before the sitting is completed. The sitting is then read back,
+    as part of its response log may have been saved in the meantime.
+    """
+    if ANSWER_BUFFER is None:
+        return
+    buffer = _buffer()
+    _write(buffer, [sitting.id])
+    sitting.load_answers()
+    keys = [END_KEY % sitting.id, DELETED_KEY % sitting.id]
+    positions = buffer.get_many(keys)
+    buffer.delete_many(keys + [
+        ANSWER_KEY % (sitting.id, position)
+        for position in range(positions.get(DELETED_KEY % sitting.id, 0),
+                              positions.get(END_KEY % sitting.id, 0))])
+
+
+def flush_answers(batch_size=500):
+    """
+    Writes the buffered answers of the sittings in the queue, batch_size
+    entries of the queue at a time. Returns the number of answers written.
+    """
+    buffer = _buffer()
+    written = 0
+    while True:
+        flushed = buffer.get(QUEUE_FLUSHED_KEY, 0)
+        head = buffer.get(QUEUE_HEAD_KEY, 0)
+        if flushed >= head:
+            return written
+        last = min(head, flushed + batch_size)
+        keys = [QUEUE_KEY % position for position in range(flushed + 1,
+                                                           last + 1)]
+        # a sitting missing from the queue, because the request adding it
+        # was interrupted, is written with its next answer or when it is
+        # completed
+        sitting_ids = set(buffer.get_many(keys).values())
+        written += _write(buffer, sitting_ids)
+        buffer.set(QUEUE_FLUSHED_KEY, last, None)
+        buffer.delete_many(keys)
+
+
+def flush_active_sittings(batch_size=500):
+    """
+    Writes the buffered answers of all the sittings in progress, whether
+    they are in the queue or not, batch_size sittings at a time.
+    Returns the number of answers written.
+    """
+    from quiz.models import Sitting
+    buffer = _buffer()
+    written = 0
+    last_id = 0
+    while True:
+        sitting_ids = list(Sitting.objects.filter(
+            active=True, id__gt=last_id).order_by('id')
+            .values_list('id', flat=True)[:batch_size])
+        if not sitting_ids:
+            return written
+        written += _write(buffer, sitting_ids)
+        last_id = sitting_ids[-1]
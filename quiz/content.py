@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+"""
+Cache of the content of the quizzes.
+
+The content of a quiz (its fields, questions, answers and their
+categories) hardly ever changes while it is being taken, so it is read
+from the database once and kept in Django's cache as plain tuples,
+under a key made of the quiz ID and a content version. The signal
+handlers in quiz.models bump the version whenever the content changes,
+so that the next request builds a new snapshot.
+The list of the categories and quizzes has a version of its own, used
+to cache the pages listing them.
+A bounded LRU of the unserialized snapshots sits in front of Django's
+cache in each process. The snapshots are made of immutable records, so
+that they can be shared by all the requests of the process, and let the
+answers be graded without reading the database.
+
+The version is kept in Django's cache as well, so with several
+processes the cache backend must be shared (memcached, database...)
+for the changes to be seen by all of them.
+"""
+import random
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_finished
+from django.db import connection
+from django.dispatch import receiver
+
+CONTENT_VERSION_KEY = 'quiz:content_version:%d'
+CONTENT_KEY = 'quiz:content:%d:%d'
+CATALOGUE_VERSION_KEY = 'quiz:catalogue_version'
+
+# seconds the snapshots are kept in Django's cache. They are never stale
+# since the key changes with the content
+CONTENT_CACHE_TIMEOUT = getattr(settings, 'QUIZ_CONTENT_CACHE_TIMEOUT',
+                                24 * 60 * 60)
+# number of snapshots, and of bytes of cached data, kept in each process
+CONTENT_LRU_SIZE = getattr(settings, 'QUIZ_CONTENT_LRU_SIZE', 100)
+CONTENT_LRU_BYTES = getattr(settings, 'QUIZ_CONTENT_LRU_BYTES',
+                            64 * 1024 * 1024)
+
+
+class AnswerContent(namedtuple('AnswerContent',
+                               'id question_id content correct')):
+    """
+    An answer of a cached quiz
+    """
+    __slots__ = ()
+
+    def __unicode__(self):
+        return self.content
+
+    __str__ = __unicode__
+
+
+class QuestionContent(namedtuple('QuestionContent',
+                                 'id content explanation category answers')):
+    """
+    A question of a cached quiz, with the tuple of its answers.
+    category is the name of the category of the question, if any.
+    """
+    __slots__ = ()
+
+    def __new__(cls, id, content, explanation, category, answers):
+        answers = tuple(AnswerContent(answer_id, id, *answer)
+                        for answer_id, answer in answers)
+        return super(QuestionContent, cls).__new__(
+            cls, id, content, explanation, category, answers)
+
+    def __unicode__(self):
+        return self.content
+
+    __str__ = __unicode__
+
+
+class QuizContent(object):
+    """
+    The content of a quiz, as read from the cache. It must not be modified
+    since it is shared by all the requests of the process.
+    Has the same attributes as a Quiz, and can be used instead of one to
+    start a sitting.
+    questions maps the IDs of the questions to the questions, in order,
+    and answers maps the IDs of all the answers to the answers.
+    size is roughly the number of bytes of the cached data.
+    """
+    __slots__ = ('id', 'title', 'description', 'category_id',
+                 'random_order', 'answers_at_end', 'exam_paper',
+                 'question_count', 'questions', 'answers', 'size')
+
+    def __init__(self, data, size=0):
+        (self.id, self.title, self.description, self.category_id,
+         self.random_order, self.answers_at_end, self.exam_paper,
+         self.question_count, questions) = data
+        self.questions = OrderedDict(
+            (question[0], QuestionContent(*question))
+            for question in questions)
+        self.answers = dict(
+            (answer.id, answer) for question in self.questions.values()
+            for answer in question.answers)
+        self.size = size
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __unicode__(self):
+        return self.title
+
+    __str__ = __unicode__
+
+    def get_question_ids(self):
+        """
+        Returns the list of the IDs of the questions of the quiz, in the
+        order they are set
+        """
+        return list(self.questions)
+
+    def get_question(self, question_id):
+        """
+        Returns the question with the given ID. The question is read from
+        the database if it is not part of the quiz any more.
+        """
+        question = self.questions.get(question_id)
+        if question is None:
+            from quiz.models import Question
+            question = QuestionContent(*_question_data(
+                Question.objects.for_display([question_id])[question_id]))
+        return question
+
+    def get_answer(self, answer_id):
+        """
+        Returns the answer with the given ID, with the ID of its question
+        and whether it is correct, or None if it is not an answer of
+        this quiz
+        """
+        return self.answers.get(answer_id)
+
+
+def _question_data(question):
+    """
+    Returns the tuple a question is cached as. Its answers must have been
+    prefetched.
+    """
+    if question.category is None:
+        category = None
+    else:
+        category = question.category.name
+    return (question.id, question.content, question.explanation, category,
+            tuple((answer.id, (answer.content, answer.correct))
+                  for answer in question.answer_set.all()))
+
+
+def _load_quiz_data(quiz_id):
+    """
+    Reads the content of the quiz from the database, in three queries.
+    Raises Quiz.DoesNotExist if there is no such quiz.
+    """
+    from quiz.models import Quiz, Question
+    quiz = Quiz.objects.get(id=quiz_id)
+    questions = Question.objects.filter(quiz__id=quiz_id) \
+        .select_related('category') \
+        .prefetch_related('answer_set')
+    return (quiz.id, quiz.title, quiz.description, quiz.category_id,
+            quiz.random_order, quiz.answers_at_end, quiz.exam_paper,
+            quiz.question_count,
+            tuple(_question_data(question) for question in questions))
+
+
+class _LRU(object):
+    """
+    A thread safe dict that only keeps the last used items, up to a number
+    of items and a total size. The size of an item is its size attribute.
+    Counts the hits, misses and evictions.
+    """
+    def __init__(self, max_items, max_size):
+        self.max_items = max_items
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.pop(key, None)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.items[key] = value
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            previous = self.items.pop(key, None)
+            if previous is not None:
+                self.size -= previous.size
+            self.items[key] = value
+            self.size += value.size
+            while len(self.items) > self.max_items or \
+                    (self.size > self.max_size and len(self.items) > 1):
+                evicted = self.items.popitem(last=False)[1]
+                self.size -= evicted.size
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            return {'items': len(self.items), 'size': self.size,
+                    'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions}
+
+
+_snapshots = _LRU(CONTENT_LRU_SIZE, CONTENT_LRU_BYTES)
+
+
+def content_cache_stats():
+    """
+    Returns the number of quizzes and bytes in the LRU of this process,
+    and its hit, miss and eviction counts
+    """
+    return _snapshots.stats()
+
+
+def _new_version():
+    """
+    A version that has not been used before, in case the previous one
+    has been evicted from the cache
+    """
+    return int(time.time() * 1000)
+
+
+def get_content_version(quiz_id):
+    """
+    Returns the current content version of the quiz
+    """
+    key = CONTENT_VERSION_KEY % quiz_id
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(quiz_ids):
+    for quiz_id in quiz_ids:
+        try:
+            cache.incr(CONTENT_VERSION_KEY % quiz_id)
+        except ValueError:
+            # not in the cache any more
+            cache.set(CONTENT_VERSION_KEY % quiz_id, _new_version(), None)
+
+
+def _bump_catalogue():
+    # the version is also the time of the change, in milliseconds, so
+    # that it can be used as Last-Modified
+    version = cache.get(CATALOGUE_VERSION_KEY) or 0
+    cache.set(CATALOGUE_VERSION_KEY, max(_new_version(), version + 1), None)
+
+
+_pending = threading.local()
+
+
+def bump_content_version(quiz_ids):
+    """
+    Changes the content version of the quizzes, so that their content is
+    read from the database again
+    """
+    quiz_ids = set(quiz_ids)
+    _bump(quiz_ids)
+    if connection.in_atomic_block:
+        # other requests may cache the previous content again until the
+        # transaction is committed, so the version is bumped once more
+        # at the end of the request
+        _pending.__dict__.setdefault('quiz_ids', set()).update(quiz_ids)
+
+
+def get_catalogue_version():
+    """
+    Returns the version of the list of the categories and quizzes,
+    which is the time of their last change in milliseconds
+    """
+    version = cache.get(CATALOGUE_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOGUE_VERSION_KEY, _new_version(), None)
+        version = cache.get(CATALOGUE_VERSION_KEY)
+    return version
+
+
+def bump_catalogue_version():
+    """
+    Changes the version of the list of the categories and quizzes, after
+    one of them has been added, changed or deleted
+    """
+    _bump_catalogue()
+    if connection.in_atomic_block:
+        _pending.catalogue = True
+
+
+@receiver(request_finished)
+def bump_pending_versions(sender, **kwargs):
+    quiz_ids = _pending.__dict__.pop('quiz_ids', None)
+    if quiz_ids:
+        _bump(quiz_ids)
+    if _pending.__dict__.pop('catalogue', False):
+        _bump_catalogue()
+
+
+def get_quiz_content(quiz_id):
+    """
+    Returns the QuizContent of the quiz with the given ID.
+    Raises Quiz.DoesNotExist if there is no such quiz.
+    """
+    quiz_id = int(quiz_id)
+    version = get_content_version(quiz_id)
+
+    content = _snapshots.get((quiz_id, version))
+    if content is None:
+        key = CONTENT_KEY % (quiz_id, version)
+        data = cache.get(key)
+        if data is None:
+            data = _load_quiz_data(quiz_id)
+            cache.set(key, data, CONTENT_CACHE_TIMEOUT)
+        size = len(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+        content = QuizContent(data, size)
+        _snapshots.set((quiz_id, version), content)
+    return content
+
+
+def shuffle_answers(answers, question_id, sitting=None):
+    """
+    Returns the answers of a question in a random order. Given a sitting,
+    the order is the same every time the question is displayed in that
+    sitting.
+    """
+    answers = sorted(answers, key=lambda answer: answer.id)
+    if sitting is not None:
+        random.Random(sitting.id * 2 ** 32 + question_id).shuffle(answers)
+    else:
+        random.shuffle(answers)
+    return answers
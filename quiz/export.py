@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Export of the results of the completed sittings of quizzes, archived or
+not, as CSV or JSON lines, optionally gzipped.
+
+Everything is a generator: the sittings are read a chunk at a time by
+ranges of IDs, with iterator() so that they are not cached, and each
+line is encoded (and compressed) as it is produced, so that the memory
+used does not depend on the number of sittings, whether the lines are
+written to a file or streamed in a StreamingHttpResponse.
+"""
+import csv
+import json
+import zlib
+from collections import OrderedDict
+
+from django.utils import six
+from django.utils.encoding import force_text
+
+from quiz.packing import unpack_ids, bitset_indexes
+
+# number of sittings read at once
+CHUNK_SIZE = 2000
+
+FIELDS = ('sitting', 'quiz', 'user', 'username', 'score', 'max_score',
+          'percent', 'incorrect_questions', 'completed')
+
+
+def result_rows(quiz_ids, chunk_size=CHUNK_SIZE):
+    """
+    Yields a tuple of the FIELDS of each completed sitting of the quizzes,
+    the archived ones first
+    """
+    from quiz.models import ArchivedSitting, Sitting
+    querysets = (ArchivedSitting.objects.filter(quiz_id__in=quiz_ids),
+                 Sitting.objects.filter(quiz_id__in=quiz_ids, complete=True))
+    for queryset in querysets:
+        last_id = 0
+        while True:
+            chunk = queryset.filter(id__gt=last_id).order_by('id') \
+                .values_list('id', 'quiz_id', 'user_id', 'user__username',
+                             'current_score', 'max_score', 'question_order',
+                             'incorrect_bitset', 'completed')[:chunk_size]
+            last_id = None
+            for (sitting_id, quiz_id, user_id, username, score, max_score,
+                 question_order, incorrect_bitset,
+                 completed) in chunk.iterator():
+                question_ids = unpack_ids(question_order)
+                incorrect = [question_ids[position] for position
+                             in bitset_indexes(incorrect_bitset)
+                             if position < len(question_ids)]
+                if max_score:
+                    percent = int(round(100.0 * score / max_score))
+                else:
+                    percent = 0
+                yield (sitting_id, quiz_id, user_id, username, score,
+                       max_score, percent, incorrect, completed)
+                last_id = sitting_id
+            if last_id is None:
+                break
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return ' '.join(str(item) for item in value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return force_text(value)
+
+
+class _Line(object):
+    """
+    A file whose writes return what is written, for csv.writer
+    """
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    """
+    Yields the header and the rows as lines of CSV, encoded in UTF-8
+    """
+    writer = csv.writer(_Line())
+    for row in _with_header(rows):
+        cells = [_cell(value) for value in row]
+        if six.PY2:
+            # the csv module of Python 2 only writes bytes
+            yield writer.writerow([cell.encode('utf-8') for cell in cells])
+        else:
+            yield writer.writerow(cells).encode('utf-8')
+
+
+def _with_header(rows):
+    yield FIELDS
+    for row in rows:
+        yield row
+
+
+def jsonl_lines(rows):
+    """
+    Yields the rows as JSON objects, one per line, encoded in UTF-8
+    """
+    for row in rows:
+        data = OrderedDict(zip(FIELDS, row))
+        if data['completed'] is not None:
+            data['completed'] = data['completed'].isoformat()
+        yield json.dumps(data).encode('utf-8') + b'\n'
+
+
+def gzip_chunks(chunks):
+    """
+    Compresses the chunks of bytes into a gzip stream as they come
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_results(quiz_ids, format='csv', compress=False,
+                   chunk_size=CHUNK_SIZE):
+    """
+    Returns a generator of the bytes of the export of the results of the
+    quizzes, in the format ('csv' or 'jsonl'), gzipped if compress
+    """
+    rows = result_rows(quiz_ids, chunk_size)
+    if format == 'csv':
+        chunks = csv_lines(rows)
+    elif format == 'jsonl':
+        chunks = jsonl_lines(rows)
+    else:
+        raise ValueError('Unknown export format %r' % format)
+    if compress:
+        chunks = gzip_chunks(chunks)
+    return chunks
@@ -1,4 +1,5 @@
 from django import forms
+from quiz.importer import FORMATS, format_of, read_bank, clean_bank
 from quiz.models import Question, Quiz
 from django.contrib.admin.widgets import FilteredSelectMultiple
 
@@ -26,3 +27,29 @@ class QuizAdminForm(forms.ModelForm):
             quiz.question_set = self.cleaned_data['questions']
             self.save_m2m()
         return quiz
+
+
+class QuestionImportForm(forms.Form):
+    """
+    Upload of a question bank, see quiz.importer
+    """
+    bank = forms.FileField(help_text='A JSON, CSV or YAML file')
+    format = forms.ChoiceField(
+        required=False,
+        choices=[('', 'From the extension')] + [
+            (format, format.upper()) for format in FORMATS])
+    dry_run = forms.BooleanField(
+        required=False,
+        help_text='Validate the file without importing it')
+
+    def clean(self):
+        cleaned_data = super(QuestionImportForm, self).clean()
+        bank = cleaned_data.get('bank')
+        if bank is None:
+            return cleaned_data
+        format = cleaned_data.get('format') or format_of(bank.name)
+        if format is None:
+            raise forms.ValidationError('Unknown format, choose one')
+        cleaned_data['questions'] = clean_bank(read_bank(bank.read(),
+                                                         format))
+        return cleaned_data
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+Import of question banks: questions with their answers, categories and
+quizzes, from JSON, CSV or YAML files.
+
+In JSON and YAML, a bank is a list of questions such as::
+
+    - content: What is 2 + 2?
+      explanation: Count them.
+      category: Arithmetic
+      quizzes: [1, 3]
+      answers:
+        - {content: '4', correct: true}
+        - {content: '5'}
+
+where the category is created if there is none with that name, and the
+quizzes are the IDs of existing quizzes. In CSV, a bank has one row per
+question, with the columns content, explanation, category, quizzes (IDs
+separated by spaces), correct (the numbers of the correct answers, from
+1, separated by spaces) and answer_1, answer_2... for as many answers as
+needed. YAML requires PyYAML.
+
+The whole bank is validated before anything is written, then the rows
+are inserted with bulk_create, batch_size at a time, in one transaction.
+bulk_create sends no signals, so the question counts and the versions of
+the cached content (see quiz.content) are updated once at the end.
+"""
+import csv
+import json
+import os
+import re
+
+from django.core.exceptions import ValidationError
+from django.db import transaction, DatabaseError
+from django.utils import six
+
+from quiz.content import bump_catalogue_version
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+FORMATS = ('json', 'csv', 'yaml')
+
+# number of rows inserted at once
+BATCH_SIZE = 500
+
+# number of invalid questions reported
+MAX_ERRORS = 20
+
+ANSWER_COLUMN_RE = re.compile(r'^answer_(\d+)$')
+
+
+def format_of(filename):
+    """
+    Returns the format of a question bank file from its extension, or None
+    """
+    extension = os.path.splitext(filename)[1].lower().lstrip('.')
+    if extension == 'yml':
+        return 'yaml'
+    return extension if extension in FORMATS else None
+
+
+def _csv_questions(text):
+    """
+    Returns the questions of a CSV bank as dicts of the JSON format
+    """
+    lines = text.splitlines(True)
+    if six.PY2:
+        # the csv module of Python 2 only reads bytes
+        rows = ([cell.decode('utf-8') for cell in row] for row in
+                csv.reader(line.encode('utf-8') for line in lines))
+    else:
+        rows = csv.reader(lines)
+
+    header = [name.strip() for name in next(rows, [])]
+    answer_columns = sorted((int(match.group(1)), i)
+                            for i, match in enumerate(
+                                ANSWER_COLUMN_RE.match(name)
+                                for name in header)
+                            if match)
+    questions = []
+    for number, row in enumerate(rows, 2):
+        if not any(cell.strip() for cell in row):
+            continue
+        values = dict(zip(header, row))
+        try:
+            correct = set(int(n) for n in values.get('correct', '').split())
+        except ValueError:
+            raise ValidationError('Row %d: the correct answers must be '
+                                  'numbers' % number)
+        questions.append({
+            'content': values.get('content'),
+            'explanation': values.get('explanation'),
+            'category': values.get('category'),
+            'quizzes': values.get('quizzes', '').split(),
+            'answers': [{'content': row[i], 'correct': n in correct}
+                        for n, i in answer_columns
+                        if i < len(row) and row[i].strip()],
+        })
+    return questions
+
+
+def read_bank(data, format):
+    """
+    Parses the bytes of a question bank file into a list of questions,
+    in the JSON format. Raises ValidationError if it cannot be parsed.
+    """
+    try:
+        text = data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise ValidationError('The file is not encoded in UTF-8')
+
+    if format == 'json':
+        try:
+            questions = json.loads(text)
+        except ValueError as e:
+            raise ValidationError('Invalid JSON: %s' % e)
+    elif format == 'yaml':
+        if yaml is None:
+            raise ValidationError('Importing YAML requires PyYAML')
+        try:
+            questions = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise ValidationError('Invalid YAML: %s' % e)
+    elif format == 'csv':
+        questions = _csv_questions(text)
+    else:
+        raise ValidationError('Unknown format "%s"' % format)
+
+    if not isinstance(questions, list):
+        raise ValidationError('The file must contain a list of questions')
+    return questions
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if not isinstance(value, six.string_types):
+        value = six.text_type(value)
+    return value.strip()
+
+
+def _clean_question(question, max_lengths):
+    """
+    Returns the question as a (content, explanation, category name, quiz
+    IDs, answers) tuple, where answers are (content, correct) pairs.
+    Raises ValueError if it is invalid.
+    """
+    if not isinstance(question, dict):
+        raise ValueError('not a question')
+    content = _text(question.get('content'))
+    explanation = _text(question.get('explanation'))
+    category = _text(question.get('category')) or None
+    for name, value in (('content', content), ('explanation', explanation),
+                        ('category', category)):
+        if value and len(value) > max_lengths[name]:
+            raise ValueError('the %s is longer than %d characters' % (
+                name, max_lengths[name]))
+    if not content:
+        raise ValueError('no content')
+
+    quizzes = question.get('quizzes') or []
+    if not isinstance(quizzes, list):
+        raise ValueError('the quizzes must be a list of IDs')
+    try:
+        quiz_ids = set(int(quiz_id) for quiz_id in quizzes)
+    except (TypeError, ValueError):
+        raise ValueError('the quizzes must be a list of IDs')
+
+    answers = []
+    for answer in question.get('answers') or []:
+        if not isinstance(answer, dict):
+            raise ValueError('the answers must be objects')
+        answer_content = _text(answer.get('content'))
+        if not answer_content:
+            raise ValueError('an answer has no content')
+        if len(answer_content) > max_lengths['answer']:
+            raise ValueError('an answer is longer than %d characters' % (
+                max_lengths['answer']))
+        answers.append((answer_content, bool(answer.get('correct'))))
+    if not any(correct for answer_content, correct in answers):
+        raise ValueError('no correct answer')
+
+    return content, explanation, category, quiz_ids, answers
+
+
+def clean_bank(questions):
+    """
+    Validates the questions read from a bank (see read_bank) and returns
+    them as tuples (see _clean_question). Raises ValidationError listing
+    the invalid questions.
+    """
+    from quiz.models import Category, Question, Answer, Quiz
+    max_lengths = {
+        'content': Question._meta.get_field('content').max_length,
+        'explanation': Question._meta.get_field('explanation').max_length,
+        'category': Category._meta.get_field('name').max_length,
+        'answer': Answer._meta.get_field('content').max_length,
+    }
+
+    cleaned = []
+    errors = []
+    for number, question in enumerate(questions, 1):
+        try:
+            cleaned.append(_clean_question(question, max_lengths))
+        except ValueError as e:
+            errors.append('Question %d: %s' % (number, e))
+
+    quiz_ids = set(quiz_id for question in cleaned
+                   for quiz_id in question[3])
+    missing = quiz_ids - set(Quiz.objects.filter(id__in=quiz_ids)
+                             .values_list('id', flat=True))
+    if missing:
+        errors.append('No quiz with the IDs %s' % ', '.join(
+            str(quiz_id) for quiz_id in sorted(missing)))
+
+    if errors:
+        if len(errors) > MAX_ERRORS:
+            errors[MAX_ERRORS:] = ['and %d more errors' % (
+                len(errors) - MAX_ERRORS)]
+        raise ValidationError(errors)
+    return cleaned
+
+
+def _create_questions(batch, category_ids):
+    """
+    Inserts the questions of the batch and returns their IDs, in order
+    """
+    from quiz.models import Question
+    last_id = Question.objects.order_by('-id') \
+        .values_list('id', flat=True).first() or 0
+    Question.objects.bulk_create([
+        Question(content=content, explanation=explanation,
+                 category_id=category_ids.get(category))
+        for content, explanation, category, quiz_ids, answers in batch])
+
+    # bulk_create does not set the IDs, but the rows inserted are the ones
+    # after the last ID, in order, possibly among rows inserted by others
+    ids = []
+    for question_id, content in Question.objects.filter(id__gt=last_id) \
+            .order_by('id').values_list('id', 'content'):
+        if len(ids) < len(batch) and content == batch[len(ids)][0]:
+            ids.append(question_id)
+    if len(ids) != len(batch):
+        raise DatabaseError('The IDs of the imported questions could not '
+                            'be read back')
+    return ids
+
+
+def import_bank(questions, batch_size=BATCH_SIZE, dry_run=False):
+    """
+    Imports the cleaned questions of a bank (see clean_bank), and returns
+    the number of categories, questions, answers and quiz memberships
+    created. With dry_run, they are all inserted, then rolled back.
+    """
+    from quiz.models import Category, Question, Answer, Quiz
+    counts = dict.fromkeys(
+        ('categories', 'questions', 'answers', 'memberships'), 0)
+    quiz_ids = set()
+
+    with transaction.atomic():
+        category_ids = dict(Category.objects.values_list('name', 'id'))
+        names = set(question[2] for question in questions if question[2])
+        new_names = sorted(names - set(category_ids))
+        if new_names:
+            Category.objects.bulk_create(
+                [Category(name=name) for name in new_names], batch_size)
+            category_ids = dict(Category.objects.values_list('name', 'id'))
+        counts['categories'] = len(new_names)
+
+        for start in range(0, len(questions), batch_size):
+            batch = questions[start:start + batch_size]
+            question_ids = _create_questions(batch, category_ids)
+            answers = [Answer(question_id=question_id, content=content,
+                              correct=correct)
+                       for question_id, question in zip(question_ids, batch)
+                       for content, correct in question[4]]
+            memberships = [Question.quiz.through(question_id=question_id,
+                                                 quiz_id=quiz_id)
+                           for question_id, question in zip(question_ids,
+                                                            batch)
+                           for quiz_id in question[3]]
+            Answer.objects.bulk_create(answers, batch_size)
+            Question.quiz.through.objects.bulk_create(memberships,
+                                                      batch_size)
+            counts['questions'] += len(batch)
+            counts['answers'] += len(answers)
+            counts['memberships'] += len(memberships)
+            quiz_ids.update(membership.quiz_id for membership in memberships)
+
+        if dry_run:
+            transaction.set_rollback(True)
+
+    if not dry_run:
+        # also bumps the content version of the quizzes
+        Quiz.update_question_counts(quiz_ids)
+        if new_names:
+            bump_catalogue_version()
+    return counts
+
+
+def describe(counts, seconds):
+    """
+    Returns a summary of an import, with its throughput in rows per second
+    """
+    rows = sum(counts.values())
+    rate = rows / max(seconds, 0.001)
+    return ('%(questions)d questions, %(answers)d answers, %(categories)d '
+            'categories and %(memberships)d quiz memberships' % counts +
+            ' in %.2f s (%.0f rows/s)' % (seconds, rate))
@@ -0,0 +1,126 @@
+import gzip
+import json
+import os
+from datetime import timedelta
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from quiz.models import ArchivedSitting, Sitting
+
+# age in days of the completed sittings moved out of the Sitting table
+ARCHIVE_AFTER_DAYS = getattr(settings, 'QUIZ_ARCHIVE_AFTER_DAYS', 365)
+
+
+class Command(BaseCommand):
+    """
+    Deletes the sittings which are finished but not kept (see
+    QUIZ_DEFER_SITTING_DELETION), and moves the sittings completed more
+    than QUIZ_ARCHIVE_AFTER_DAYS days ago to the ArchivedSitting table,
+    or to a gzipped JSON lines file with --directory, so that the
+    Sitting table only holds the sittings in use. The sittings archived
+    to files are left out of quiz_rebuild_stats and quiz_export_results.
+    Both are done in batches, each in a transaction of its own, so that
+    it can run while quizzes are being taken. Run it periodically.
+    """
+    help = 'Deletes the finished sittings and archives the old ones'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--days', type='int', default=ARCHIVE_AFTER_DAYS,
+                    help='Archive the sittings completed more than DAYS '
+                    'days ago'),
+        make_option('--batch-size', type='int', default=1000,
+                    help='Number of sittings moved per transaction'),
+        make_option('--directory',
+                    help='Write the archived sittings to a file in '
+                    'DIRECTORY instead of the archive table'),
+    )
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        if directory and not os.path.isdir(directory):
+            raise CommandError('%s is not a directory' % directory)
+
+        deleted = self.delete_finished(options['batch_size'])
+        self.stdout.write('Deleted %d finished sittings' % deleted)
+
+        before = timezone.now() - timedelta(days=options['days'])
+        if directory:
+            path = os.path.join(directory, 'sittings-%s.jsonl.gz' % (
+                timezone.now().strftime('%Y%m%d%H%M%S')))
+            with gzip.open(path, 'ab') as archive:
+                archived = self.archive(before, options['batch_size'],
+                                        archive)
+            if not archived:
+                os.remove(path)
+        else:
+            archived = self.archive(before, options['batch_size'])
+        self.stdout.write('Archived %d sittings' % archived)
+
+    def delete_finished(self, batch_size):
+        """
+        Deletes the sittings neither active nor complete, batch_size at
+        a time, and returns their number
+        """
+        deleted = 0
+        last_id = 0
+        while True:
+            sitting_ids = list(Sitting.objects.filter(
+                id__gt=last_id, active=None, complete=False)
+                .order_by('id').values_list('id', flat=True)[:batch_size])
+            if not sitting_ids:
+                return deleted
+            Sitting.objects.filter(id__in=sitting_ids).delete()
+            deleted += len(sitting_ids)
+            last_id = sitting_ids[-1]
+
+    def archive(self, before, batch_size, archive=None):
+        """
+        Moves the sittings completed before the given time to the archive
+        table, or to the archive file if given, batch_size at a time, and
+        returns their number.
+        The sittings written to the file are deleted once it has been
+        flushed, so that they are written again if the command stops in
+        between, rather than lost.
+        """
+        archived = 0
+        last_id = 0
+        while True:
+            sittings = list(Sitting.objects.filter(
+                id__gt=last_id, complete=True, completed__lt=before)
+                .order_by('id')[:batch_size])
+            if not sittings:
+                return archived
+            sitting_ids = [sitting.id for sitting in sittings]
+
+            if archive is None:
+                with transaction.atomic():
+                    ArchivedSitting.objects.bulk_create([
+                        ArchivedSitting.from_sitting(sitting)
+                        for sitting in sittings])
+                    Sitting.objects.filter(id__in=sitting_ids).delete()
+            else:
+                for sitting in sittings:
+                    archive.write(json.dumps(self.as_json(sitting))
+                                  .encode('utf-8') + b'\n')
+                archive.flush()
+                os.fsync(archive.fileno())
+                Sitting.objects.filter(id__in=sitting_ids).delete()
+
+            archived += len(sittings)
+            last_id = sitting_ids[-1]
+
+    def as_json(self, sitting):
+        return {
+            'id': sitting.id,
+            'user': sitting.user_id,
+            'quiz': sitting.quiz_id,
+            'questions': list(sitting.question_ids),
+            'incorrect': sitting.get_incorrect_questions(),
+            'score': sitting.current_score,
+            'max_score': sitting.max_score,
+            'completed': sitting.completed.isoformat(),
+        }
@@ -0,0 +1,193 @@
+import random
+import time
+from datetime import timedelta
+from importlib import import_module
+from optparse import make_option
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from quiz.models import Category, Quiz, Question, Answer, Sitting
+from quiz.packing import pack_ids
+
+BENCHMARK_PREFIX = 'quiz-benchmark-'
+
+# the indexes of the lookups benchmarked, left out with --without-indexes
+INDEXED_MODELS = (Answer, Sitting)
+lookup_indexes = import_module('quiz.migrations.0005_lookup_indexes')
+
+
+class Command(BaseCommand):
+    """
+    Reports the query plans and latencies of the hot queries of the app.
+    Meant to be run on a scratch database: with --seed, it first fills
+    it with generated users, quizzes and sittings.
+    Run it with and without --without-indexes to compare the queries with
+    the indexes of the lookups and without them. --without-indexes drops
+    those indexes before running the queries and creates them again
+    afterwards.
+    """
+    help = 'Reports the query plans and latencies of the hot queries'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--seed', action='store_true', default=False,
+                    help='Create the benchmark dataset first'),
+        make_option('--users', type='int', default=100000),
+        make_option('--sittings', type='int', default=1000000),
+        make_option('--quizzes', type='int', default=50),
+        make_option('--questions', type='int', default=50,
+                    help='Number of questions per quiz'),
+        make_option('--runs', type='int', default=200,
+                    help='Number of times each query is run'),
+        make_option('--without-indexes', action='store_true',
+                    default=False,
+                    help='Run the queries without the indexes of the '
+                         'lookups'),
+    )
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options)
+
+        users = list(User.objects.filter(
+            username__startswith=BENCHMARK_PREFIX)
+            .values_list('id', flat=True)[:10000])
+        quizzes = list(Quiz.objects.filter(
+            title__startswith=BENCHMARK_PREFIX)
+            .values_list('id', flat=True))
+        questions = list(Question.objects.filter(
+            quiz__id__in=quizzes).values_list('id', flat=True)[:10000])
+        if not (users and quizzes and questions):
+            raise CommandError('No benchmark dataset, run with --seed')
+
+        queries = (
+            ('incomplete sitting of a user',
+             lambda: Sitting.objects.filter(
+                 user=random.choice(users), quiz=random.choice(quizzes),
+                 active=True)),
+            ('past exams of a user',
+             lambda: Sitting.objects.filter(
+                 user=random.choice(users), complete=True)
+             .select_related('quiz').order_by('-completed', '-id')[:50]),
+            ('answers of a question',
+             lambda: Answer.objects.filter(
+                 question=random.choice(questions)).order_by('id')),
+            ('correct answers of a question',
+             lambda: Answer.objects.filter(
+                 question=random.choice(questions), correct=True)),
+            ('questions of a quiz',
+             lambda: Question.objects.filter(
+                 quiz__id=random.choice(quizzes))
+             .order_by().values_list('id', flat=True)),
+        )
+        if options['without_indexes']:
+            self.drop_indexes()
+        try:
+            for name, queryset in queries:
+                self.report(name, queryset, options['runs'])
+        finally:
+            if options['without_indexes']:
+                self.create_indexes()
+
+    def drop_indexes(self):
+        with connection.schema_editor() as editor:
+            for model in INDEXED_MODELS:
+                editor.alter_index_together(
+                    model, model._meta.index_together, ())
+            lookup_indexes.drop_question_quiz_index(None, editor)
+
+    def create_indexes(self):
+        with connection.schema_editor() as editor:
+            for model in INDEXED_MODELS:
+                editor.alter_index_together(
+                    model, (), model._meta.index_together)
+            lookup_indexes.create_question_quiz_index(None, editor)
+
+    def report(self, name, queryset, runs):
+        sql, params = queryset().query.sql_with_params()
+        if connection.vendor == 'sqlite':
+            explain = 'EXPLAIN QUERY PLAN '
+        else:
+            explain = 'EXPLAIN '
+        cursor = connection.cursor()
+        cursor.execute(explain + sql, params)
+        plan = cursor.fetchall()
+
+        timings = []
+        for i in range(runs):
+            queryset_run = queryset()
+            start = time.time()
+            list(queryset_run)
+            timings.append(time.time() - start)
+        timings.sort()
+
+        self.stdout.write(name)
+        for row in plan:
+            self.stdout.write('    %s' % ' '.join(str(c) for c in row))
+        self.stdout.write('    mean %.3f ms, median %.3f ms, max %.3f ms' % (
+            1000 * sum(timings) / len(timings),
+            1000 * timings[len(timings) // 2],
+            1000 * timings[-1]))
+
+    @transaction.atomic
+    def seed(self, options):
+        category = Category.objects.get_or_create(
+            name=BENCHMARK_PREFIX + 'category')[0]
+
+        quizzes = []
+        for i in range(options['quizzes']):
+            quiz = Quiz.objects.create(
+                title='%s%d' % (BENCHMARK_PREFIX, i), category=category)
+            questions = Question.objects.bulk_create([
+                Question(content='Question %d' % j, category=category)
+                for j in range(options['questions'])])
+            # bulk_create does not return the IDs on every backend
+            questions = list(Question.objects.filter(
+                content__in=[q.content for q in questions],
+                category=category, quiz=None))
+            quiz.question_set.add(*questions)
+            Answer.objects.bulk_create([
+                Answer(question=question, content='Answer %d' % k,
+                       correct=(k == 0))
+                for question in questions for k in range(4)])
+            quizzes.append((quiz, [q.id for q in questions]))
+        self.stdout.write('Created %d quizzes' % len(quizzes))
+
+        first_user = User.objects.count()
+        for start in range(0, options['users'], 1000):
+            User.objects.bulk_create([
+                User(username='%s%d' % (BENCHMARK_PREFIX, first_user + i))
+                for i in range(start, min(start + 1000,
+                                          options['users']))])
+        users = list(User.objects.filter(
+            username__startswith=BENCHMARK_PREFIX)
+            .values_list('id', flat=True))
+        self.stdout.write('Created %d users' % options['users'])
+
+        sittings = options['sittings']
+        if sittings > len(users) * len(quizzes):
+            raise CommandError('Not enough users and quizzes for %d '
+                               'sittings' % sittings)
+        now = timezone.now()
+        for start in range(0, sittings, 1000):
+            batch = []
+            for i in range(start, min(start + 1000, sittings)):
+                quiz, question_ids = quizzes[
+                    (i // len(users)) % len(quizzes)]
+                # the last sitting of each user is left incomplete
+                complete = i < sittings - len(users)
+                batch.append(Sitting(
+                    user_id=users[i % len(users)],
+                    quiz=quiz,
+                    question_order=pack_ids(question_ids),
+                    cursor=len(question_ids) if complete else 0,
+                    current_score=random.randint(0, len(question_ids)),
+                    max_score=len(question_ids),
+                    complete=complete,
+                    completed=now - timedelta(minutes=sittings - i)
+                    if complete else None,
+                    active=None if complete else True))
+            Sitting.objects.bulk_create(batch)
+        self.stdout.write('Created %d sittings' % sittings)
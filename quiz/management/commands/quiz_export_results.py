@@ -0,0 +1,52 @@
+import sys
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.export import CHUNK_SIZE, export_results
+from quiz.models import Quiz
+
+
+class Command(BaseCommand):
+    """
+    Writes the results of the completed sittings of the quizzes, archived
+    or not, as CSV or JSON lines, to a file or to the standard output.
+    The sittings are read and written chunk_size at a time, so the memory
+    used does not depend on their number.
+    """
+    args = '<quiz_id quiz_id ...>'
+    help = 'Exports the results of quizzes as CSV or JSON lines'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--format', type='choice', default='csv',
+                    choices=('csv', 'jsonl')),
+        make_option('--gzip', action='store_true', default=False,
+                    help='Compress the export with gzip'),
+        make_option('--output',
+                    help='Write the export to OUTPUT instead of the '
+                    'standard output'),
+        make_option('--chunk-size', type='int', default=CHUNK_SIZE,
+                    help='Number of sittings read at once'),
+    )
+
+    def handle(self, *args, **options):
+        if not args:
+            raise CommandError('Usage: quiz_export_results %s' % self.args)
+        quiz_ids = []
+        for quiz_id in args:
+            try:
+                quiz_ids.append(Quiz.objects.get(id=quiz_id).id)
+            except (Quiz.DoesNotExist, ValueError):
+                raise CommandError('Quiz "%s" does not exist' % quiz_id)
+
+        chunks = export_results(quiz_ids, options['format'],
+                                options['gzip'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            output = getattr(sys.stdout, 'buffer', sys.stdout)
+            for chunk in chunks:
+                output.write(chunk)
+            output.flush()
@@ -0,0 +1,43 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.buffer import ANSWER_BUFFER, flush_answers, flush_active_sittings
+
+
+class Command(BaseCommand):
+    """
+    Writes the answers buffered in QUIZ_ANSWER_BUFFER to the sittings.
+    Run it every few seconds, or with --interval to keep it running.
+    After a crash, --all also writes the answers of the sittings that
+    did not make it to the queue.
+    """
+    help = 'Writes the buffered answers to the sittings'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', type='int', default=500,
+                    help='Number of sittings written per transaction'),
+        make_option('--interval', type='float',
+                    help='Keep running, flushing every INTERVAL seconds'),
+        make_option('--all', action='store_true', default=False,
+                    help='Write the answers of all the sittings in '
+                    'progress'),
+    )
+
+    def handle(self, *args, **options):
+        if ANSWER_BUFFER is None:
+            raise CommandError('QUIZ_ANSWER_BUFFER is not set, answers are '
+                               'not buffered')
+
+        if options['all']:
+            written = flush_active_sittings(options['batch_size'])
+            self.stdout.write('Wrote %d answers' % written)
+
+        while True:
+            written = flush_answers(options['batch_size'])
+            if written or int(options['verbosity']) > 1:
+                self.stdout.write('Wrote %d answers' % written)
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
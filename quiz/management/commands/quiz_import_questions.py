@@ -0,0 +1,56 @@
+import time
+from optparse import make_option
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.importer import BATCH_SIZE, FORMATS, format_of, read_bank, \
+    clean_bank, import_bank, describe
+
+
+class Command(BaseCommand):
+    """
+    Imports a bank of questions, with their answers, categories and
+    quizzes, from a JSON, CSV or YAML file (see quiz.importer), in one
+    transaction. With --dry-run, the bank is validated and imported, then
+    the import is rolled back.
+    """
+    args = '<file>'
+    help = 'Imports questions from a JSON, CSV or YAML file'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--format', type='choice', choices=FORMATS,
+                    help='Format of the file, by default from its '
+                    'extension'),
+        make_option('--dry-run', action='store_true', default=False,
+                    help='Validate the file without importing it'),
+        make_option('--batch-size', type='int', default=BATCH_SIZE,
+                    help='Number of rows inserted at once'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError('Usage: quiz_import_questions %s' % self.args)
+        path = args[0]
+        format = options['format'] or format_of(path)
+        if format is None:
+            raise CommandError('Unknown format of %s, use --format' % path)
+        try:
+            with open(path, 'rb') as bank:
+                data = bank.read()
+        except IOError as e:
+            raise CommandError(str(e))
+
+        start = time.time()
+        try:
+            questions = clean_bank(read_bank(data, format))
+        except ValidationError as e:
+            raise CommandError('\n'.join(e.messages))
+        counts = import_bank(questions, options['batch_size'],
+                             options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write('Validated %s, nothing imported' % describe(
+                counts, time.time() - start))
+        else:
+            self.stdout.write('Imported %s' % describe(
+                counts, time.time() - start))
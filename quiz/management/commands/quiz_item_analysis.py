@@ -0,0 +1,38 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.analysis import CHUNK_SIZE, analyse_quiz
+from quiz.models import Quiz
+
+
+class Command(BaseCommand):
+    """
+    Computes the p-value and discrimination of the questions, and the
+    selection rate of the answers, of the given quizzes (all of them if
+    none is given) from the responses of their sittings which have
+    ended.
+    Requires NumPy.
+    """
+    args = '[<quiz_id> ...]'
+    help = 'Computes the item analysis of the questions of quizzes'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', type='int', default=CHUNK_SIZE,
+                    help='Number of sittings read at once'),
+    )
+
+    def handle(self, *args, **options):
+        quizzes = Quiz.objects.all()
+        if args:
+            quizzes = quizzes.filter(id__in=args)
+            if len(quizzes) != len(set(args)):
+                raise CommandError('Some of the quizzes do not exist')
+
+        for quiz in quizzes:
+            try:
+                sittings = analyse_quiz(quiz, options['chunk_size'])
+            except ImportError as e:
+                raise CommandError(str(e))
+            self.stdout.write('Analysed %d sittings of "%s"' % (
+                sittings, quiz))
@@ -0,0 +1,188 @@
+import json
+import random
+import re
+import threading
+import time
+from importlib import import_module
+from optparse import make_option
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY, BACKEND_SESSION_KEY, \
+    HASH_SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.client import Client
+
+from quiz.models import Quiz, Sitting
+
+LOAD_TEST_PREFIX = 'quiz-load-test-'
+
+GUESS_RE = re.compile(r'name="guess" value="(\d+)"')
+
+
+def _login(client, user):
+    """
+    Logs the client in without checking a password
+    """
+    engine = import_module(settings.SESSION_ENGINE)
+    session = engine.SessionStore()
+    session[SESSION_KEY] = user.pk
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+
+class Command(BaseCommand):
+    """
+    Has users take a quiz concurrently, through the pages showing one
+    question at a time and through the JSON API answering several
+    questions per request, and reports the throughput of each.
+    The requests are handled in this process, without a web server, so
+    run it against a scratch database with the same settings as the site.
+    """
+    args = '<quiz_id>'
+    help = 'Compares the throughput of the quiz pages and of the JSON API'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--users', type='int', default=100,
+                    help='Number of users taking the quiz'),
+        make_option('--concurrency', type='int', default=10,
+                    help='Number of users taking the quiz at the same time'),
+        make_option('--batch', type='int', default=10,
+                    help='Number of answers per request to the JSON API'),
+        make_option('--flow', type='choice', default='both',
+                    choices=('pages', 'api', 'both')),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError('Usage: quiz_load_test %s' % self.args)
+        try:
+            quiz = Quiz.objects.get(id=args[0])
+        except (Quiz.DoesNotExist, ValueError):
+            raise CommandError('Quiz "%s" does not exist' % args[0])
+        if not quiz.question_count:
+            raise CommandError('Quiz "%s" has no questions' % quiz)
+
+        users = self.get_users(options['users'])
+        if options['flow'] in ('pages', 'both'):
+            self.run('pages', self.take_pages, quiz, users, options)
+        if options['flow'] in ('api', 'both'):
+            self.run('api', self.take_api, quiz, users, options)
+
+    def get_users(self, count):
+        existing = User.objects.filter(
+            username__startswith=LOAD_TEST_PREFIX).count()
+        User.objects.bulk_create([
+            User(username='%s%d' % (LOAD_TEST_PREFIX, i), password='!')
+            for i in range(existing, count)])
+        return list(User.objects.filter(
+            username__startswith=LOAD_TEST_PREFIX).order_by('id')[:count])
+
+    def run(self, name, take, quiz, users, options):
+        # every user starts the quiz from the beginning
+        Sitting.objects.filter(quiz=quiz, user__in=users).delete()
+
+        pending = list(users)
+        lock = threading.Lock()
+        timings = []
+        errors = []
+
+        def worker():
+            client = Client()
+            try:
+                while True:
+                    with lock:
+                        if not pending:
+                            return
+                        user = pending.pop()
+                    _login(client, user)
+                    try:
+                        user_timings = take(client, quiz, options)
+                    except Exception as e:
+                        with lock:
+                            errors.append('%s: %r' % (user, e))
+                    else:
+                        with lock:
+                            timings.extend(user_timings)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker)
+                   for i in range(options['concurrency'])]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - start
+
+        timings.sort()
+        answers = (len(users) - len(errors)) * quiz.question_count
+        self.stdout.write(name)
+        self.stdout.write('    %d users in %.2f s, %.1f users/s, '
+                          '%.1f answers/s' % (
+                              len(users), elapsed, len(users) / elapsed,
+                              answers / elapsed))
+        if timings:
+            self.stdout.write('    %d requests, median %.1f ms, '
+                              '95th percentile %.1f ms' % (
+                                  len(timings),
+                                  1000 * timings[len(timings) // 2],
+                                  1000 * timings[len(timings) * 95 // 100]))
+        for error in errors:
+            self.stderr.write('    %s' % error)
+
+    def take_pages(self, client, quiz, options):
+        """
+        Answers the questions one page at a time, returns the duration
+        of each request
+        """
+        url = reverse('quiz_take', args=[quiz.id])
+        timings = []
+        data = {}
+        while True:
+            start = time.time()
+            response = client.get(url, data)
+            timings.append(time.time() - start)
+            if response.status_code != 200:
+                raise CommandError('%s returned %d' % (
+                    url, response.status_code))
+            guesses = GUESS_RE.findall(response.content.decode('utf-8'))
+            if not guesses:
+                return timings
+            data = {'guess': random.choice(guesses)}
+
+    def take_api(self, client, quiz, options):
+        """
+        Answers the questions batch by batch through the JSON API,
+        returns the duration of each request
+        """
+        questions_url = reverse('quiz_api_questions', args=[quiz.id])
+        answers_url = reverse('quiz_api_answers', args=[quiz.id])
+        timings = []
+        while True:
+            start = time.time()
+            response = client.get(questions_url, {'limit': options['batch']})
+            timings.append(time.time() - start)
+            if response.status_code != 200:
+                raise CommandError('%s returned %d' % (
+                    questions_url, response.status_code))
+            questions = json.loads(response.content.decode('utf-8'))
+
+            body = json.dumps({'answers': [
+                {'question': question['id'],
+                 'answer': random.choice(question['answers'])['id']}
+                for question in questions['questions']]})
+            start = time.time()
+            response = client.post(answers_url, body,
+                                   content_type='application/json')
+            timings.append(time.time() - start)
+            if response.status_code != 200:
+                raise CommandError('%s returned %d' % (
+                    answers_url, response.status_code))
+            if 'result' in json.loads(response.content.decode('utf-8')):
+                return timings
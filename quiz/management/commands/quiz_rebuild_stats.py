@@ -0,0 +1,38 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.models import Quiz, QuizStats
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the statistics of the given exam papers (all of them if
+    none is given) from their completed sittings, to fill them in for the
+    sittings completed before they were kept, or to repair them. The
+    sittings of the other quizzes are not kept, so their statistics are
+    left as they are.
+    """
+    args = '[<quiz_id> ...]'
+    help = 'Recomputes the statistics of quizzes from their sittings'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', type='int', default=10000,
+                    help='Number of sittings read at once'),
+    )
+
+    def handle(self, *args, **options):
+        quizzes = Quiz.objects.all()
+        if args:
+            quizzes = quizzes.filter(id__in=args)
+            if len(quizzes) != len(set(args)):
+                raise CommandError('Some of the quizzes do not exist')
+
+        for quiz in quizzes:
+            if not quiz.exam_paper:
+                if args:
+                    self.stderr.write('%s: not an exam paper, its sittings '
+                                      'are not kept' % quiz)
+                continue
+            stats = QuizStats.objects.rebuild(quiz.id, options['chunk_size'])
+            self.stdout.write('%s: %d sittings' % (quiz, stats.attempts))
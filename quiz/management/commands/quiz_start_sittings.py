@@ -0,0 +1,48 @@
+from optparse import make_option
+
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.models import Quiz, Sitting
+
+
+class Command(BaseCommand):
+    """
+    Creates the sittings of a quiz ahead of a scheduled start, so that
+    users starting the quiz at the same time only have to read them
+    """
+    args = '<quiz_id>'
+    help = 'Creates a sitting of a quiz for every user of a group'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--group',
+                    help='Name of the group of users sitting the quiz. '
+                    'All the active users if not given.'),
+        make_option('--batch-size', type='int', default=500,
+                    help='Number of sittings inserted per query'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError('Usage: quiz_start_sittings %s' % self.args)
+
+        try:
+            quiz = Quiz.objects.get(id=args[0])
+        except (Quiz.DoesNotExist, ValueError):
+            raise CommandError('Quiz "%s" does not exist' % args[0])
+
+        if options['group']:
+            try:
+                group = Group.objects.get(name=options['group'])
+            except Group.DoesNotExist:
+                raise CommandError(
+                    'Group "%s" does not exist' % options['group'])
+            users = group.user_set.filter(is_active=True)
+        else:
+            users = User.objects.filter(is_active=True)
+
+        created = Sitting.objects.bulk_start(
+            quiz, users.only('id').iterator(),
+            batch_size=options['batch_size'])
+
+        self.stdout.write('Created %d sittings of "%s"' % (created, quiz))
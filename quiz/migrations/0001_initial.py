@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Answer',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('content', models.CharField(help_text=b'Enter the answer text that you want displayed', max_length=1000)),
+                ('correct', models.BooleanField(default=False, help_text=b'Is this a correct answer?')),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('name', models.CharField(unique=True, max_length=250)),
+            ],
+            options={
+                'verbose_name': 'Category',
+                'verbose_name_plural': 'Categories',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='Question',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('content', models.CharField(help_text=b'Enter the question text that you want displayed', max_length=1000, verbose_name=b'Question')),
+                ('explanation', models.TextField(help_text=b'Explanation to be shown after the question has been answered.', max_length=2000, verbose_name=b'Explanation', blank=True)),
+                ('category', models.ForeignKey(blank=True, to='quiz.Category', null=True)),
+            ],
+            options={
+                'ordering': ['category'],
+                'verbose_name': 'Question',
+                'verbose_name_plural': 'Questions',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='Quiz',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('title', models.CharField(max_length=60)),
+                ('description', models.TextField(help_text=b'a description of the quiz', blank=True)),
+                ('random_order', models.BooleanField(default=False, help_text=b'Display the questions in a random order or as they are set?')),
+                ('answers_at_end', models.BooleanField(default=False, help_text=b'Correct answer is NOT shown after question. Answers displayed at end')),
+                ('exam_paper', models.BooleanField(default=False, help_text=b'If yes, the result of each attempt by a user will be stored')),
+                ('category', models.ForeignKey(blank=True, to='quiz.Category', null=True)),
+            ],
+            options={
+                'verbose_name': 'Quiz',
+                'verbose_name_plural': 'Quizzes',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='Sitting',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('question_list', models.TextField()),
+                ('incorrect_questions', models.TextField(blank=True)),
+                ('current_score', models.TextField()),
+                ('complete', models.BooleanField(default=False)),
+                ('quiz', models.ForeignKey(to='quiz.Quiz')),
+                ('user', models.ForeignKey(to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='quiz',
+            field=models.ManyToManyField(to='quiz.Quiz', blank=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='answer',
+            name='question',
+            field=models.ForeignKey(to='quiz.Question'),
+            preserve_default=True,
+        ),
+    ]
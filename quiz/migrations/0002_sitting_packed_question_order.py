@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+from quiz.packing import pack_ids, unpack_ids, \
+    empty_bitset, bitset_set, bitset_indexes
+
+
+def _csv_ids(csv):
+    """
+    Parses one of the legacy comma separated lists of IDs
+    """
+    return [int(i) for i in csv.split(',') if i.strip()]
+
+
+def csv_to_packed(apps, schema_editor):
+    """
+    The legacy question_list only holds the questions not answered yet.
+    The answered ones are rebuilt from the questions of the quiz and put
+    in front of them, with the cursor pointing at the first unanswered one.
+    """
+    Sitting = apps.get_model('quiz', 'Sitting')
+    Question = apps.get_model('quiz', 'Question')
+    # the questions of each quiz, read once for all its sittings
+    quiz_questions = {}
+    sittings = Sitting.objects.values_list(
+        'id', 'quiz_id', 'question_list', 'incorrect_questions')
+    for sitting_id, quiz_id, question_list, incorrect_questions \
+            in sittings.iterator():
+        remaining = _csv_ids(question_list)
+        incorrect = _csv_ids(incorrect_questions)
+
+        if quiz_id not in quiz_questions:
+            quiz_questions[quiz_id] = list(
+                Question.objects.filter(quiz__id=quiz_id)
+                .order_by('id').values_list('id', flat=True))
+        seen = set(remaining)
+        answered = []
+        for question_id in incorrect + quiz_questions[quiz_id]:
+            if question_id not in seen:
+                seen.add(question_id)
+                answered.append(question_id)
+
+        order = answered + remaining
+        positions = dict((question_id, position)
+                         for position, question_id in enumerate(order))
+        bitset = empty_bitset(len(order))
+        for question_id in incorrect:
+            bitset = bitset_set(bitset, positions[question_id])
+
+        Sitting.objects.filter(id=sitting_id).update(
+            question_order=pack_ids(order),
+            cursor=len(answered),
+            incorrect_bitset=bytes(bitset))
+
+
+def packed_to_csv(apps, schema_editor):
+    Sitting = apps.get_model('quiz', 'Sitting')
+    sittings = Sitting.objects.values_list(
+        'id', 'question_order', 'cursor', 'incorrect_bitset')
+    for sitting_id, question_order, cursor, incorrect_bitset \
+            in sittings.iterator():
+        order = unpack_ids(question_order)
+        Sitting.objects.filter(id=sitting_id).update(
+            question_list=''.join('%d,' % i for i in order[cursor:]),
+            incorrect_questions=''.join(
+                '%d,' % order[position]
+                for position in bitset_indexes(incorrect_bitset)
+                if position < len(order)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sitting',
+            name='question_order',
+            field=models.BinaryField(default=b''),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='sitting',
+            name='cursor',
+            field=models.PositiveIntegerField(default=0),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='sitting',
+            name='incorrect_bitset',
+            field=models.BinaryField(default=b'', blank=True),
+            preserve_default=True,
+        ),
+        # defaults so that the legacy columns can be restored on rollback
+        migrations.AlterField(
+            model_name='sitting',
+            name='question_list',
+            field=models.TextField(default=''),
+            preserve_default=True,
+        ),
+        migrations.AlterField(
+            model_name='sitting',
+            name='incorrect_questions',
+            field=models.TextField(default='', blank=True),
+            preserve_default=True,
+        ),
+        migrations.RunPython(csv_to_packed, packed_to_csv),
+        migrations.RemoveField(
+            model_name='sitting',
+            name='question_list',
+        ),
+        migrations.RemoveField(
+            model_name='sitting',
+            name='incorrect_questions',
+        ),
+    ]
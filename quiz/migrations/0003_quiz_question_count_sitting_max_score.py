@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+from quiz.packing import unpack_ids
+
+
+def fill_counts(apps, schema_editor):
+    Quiz = apps.get_model('quiz', 'Quiz')
+    Question = apps.get_model('quiz', 'Question')
+    Sitting = apps.get_model('quiz', 'Sitting')
+    for quiz in Quiz.objects.all().iterator():
+        count = Question.objects.filter(quiz__id=quiz.id).count()
+        Quiz.objects.filter(id=quiz.id).update(question_count=count)
+    # the question order of a sitting holds all of its questions
+    for sitting in Sitting.objects.all().iterator():
+        max_score = len(unpack_ids(sitting.question_order))
+        Sitting.objects.filter(id=sitting.id).update(max_score=max_score)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0002_sitting_packed_question_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='question_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='sitting',
+            name='max_score',
+            field=models.PositiveIntegerField(default=0),
+            preserve_default=True,
+        ),
+        migrations.RunPython(fill_counts, lambda apps, schema_editor: None),
+    ]
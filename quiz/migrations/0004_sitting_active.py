@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def collapse_duplicates(apps, schema_editor):
+    """
+    Only keeps the first incomplete sitting of a user for a quiz,
+    the one that was being used, and marks the complete ones inactive
+    """
+    Sitting = apps.get_model('quiz', 'Sitting')
+    Sitting.objects.filter(complete=True).update(active=None)
+
+    seen = set()
+    duplicates = []
+    incomplete = Sitting.objects.filter(complete=False) \
+        .order_by('id').values_list('id', 'user_id', 'quiz_id')
+    for sitting_id, user_id, quiz_id in incomplete.iterator():
+        if (user_id, quiz_id) in seen:
+            duplicates.append(sitting_id)
+        else:
+            seen.add((user_id, quiz_id))
+    for start in range(0, len(duplicates), 500):
+        Sitting.objects.filter(id__in=duplicates[start:start + 500]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0003_quiz_question_count_sitting_max_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sitting',
+            name='active',
+            field=models.NullBooleanField(default=True, editable=False),
+            preserve_default=True,
+        ),
+        migrations.RunPython(collapse_duplicates,
+                             lambda apps, schema_editor: None),
+        migrations.AlterUniqueTogether(
+            name='sitting',
+            unique_together=set([('user', 'quiz', 'active')]),
+        ),
+    ]
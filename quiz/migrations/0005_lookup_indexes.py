@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+# the table relating questions and quizzes is created by Django, so its
+# index is not declared on a model. This one covers fetching the
+# question IDs of a quiz without reading the table itself.
+QUESTION_QUIZ_INDEX = 'quiz_question_quiz_quiz_id_question_id'
+
+
+def create_question_quiz_index(apps, schema_editor):
+    schema_editor.execute('CREATE INDEX %s ON %s (%s, %s)' % (
+        schema_editor.quote_name(QUESTION_QUIZ_INDEX),
+        schema_editor.quote_name('quiz_question_quiz'),
+        schema_editor.quote_name('quiz_id'),
+        schema_editor.quote_name('question_id')))
+
+
+def drop_question_quiz_index(apps, schema_editor):
+    sql = 'DROP INDEX %s' % schema_editor.quote_name(QUESTION_QUIZ_INDEX)
+    if schema_editor.connection.vendor == 'mysql':
+        sql += ' ON %s' % schema_editor.quote_name('quiz_question_quiz')
+    schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0004_sitting_active'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='answer',
+            index_together=set([('question', 'id'), ('question', 'correct')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='sitting',
+            index_together=set([('user', 'complete')]),
+        ),
+        migrations.RunPython(create_question_quiz_index,
+                             drop_question_quiz_index),
+    ]
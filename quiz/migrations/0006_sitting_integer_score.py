@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def _ids_by_score(sittings):
+    """
+    Groups the IDs of the sittings by score, so that all the sittings
+    with the same score are updated at once
+    """
+    ids_by_score = {}
+    for sitting_id, score in sittings.iterator():
+        ids_by_score.setdefault(score, []).append(sitting_id)
+    return ids_by_score
+
+
+def text_to_integer(apps, schema_editor):
+    Sitting = apps.get_model('quiz', 'Sitting')
+    sittings = Sitting.objects.values_list('id', 'current_score')
+    for score, ids in _ids_by_score(sittings).items():
+        score = int(score.strip() or 0)
+        for start in range(0, len(ids), 500):
+            Sitting.objects.filter(id__in=ids[start:start + 500]) \
+                .update(integer_score=score)
+
+
+def integer_to_text(apps, schema_editor):
+    Sitting = apps.get_model('quiz', 'Sitting')
+    sittings = Sitting.objects.values_list('id', 'integer_score')
+    for score, ids in _ids_by_score(sittings).items():
+        for start in range(0, len(ids), 500):
+            Sitting.objects.filter(id__in=ids[start:start + 500]) \
+                .update(current_score=str(score))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0005_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sitting',
+            name='integer_score',
+            field=models.PositiveIntegerField(default=0),
+            preserve_default=True,
+        ),
+        # a default so that the text column can be restored on rollback
+        migrations.AlterField(
+            model_name='sitting',
+            name='current_score',
+            field=models.TextField(default='0'),
+            preserve_default=True,
+        ),
+        migrations.RunPython(text_to_integer, integer_to_text),
+        migrations.RemoveField(
+            model_name='sitting',
+            name='current_score',
+        ),
+        migrations.RenameField(
+            model_name='sitting',
+            old_name='integer_score',
+            new_name='current_score',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0006_sitting_integer_score'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='quiz',
+            index_together=set([('category', 'title', 'id')]),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.db.models.deletion
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('quiz', '0007_quiz_listing_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Response',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('sitting_id', models.PositiveIntegerField()),
+                ('correct', models.BooleanField(default=False)),
+                ('answered', models.DateTimeField()),
+                ('time_taken', models.PositiveIntegerField(null=True, blank=True)),
+                ('answer', models.ForeignKey(on_delete=django.db.models.deletion.SET_NULL, blank=True, to='quiz.Answer', null=True)),
+                ('question', models.ForeignKey(to='quiz.Question')),
+                ('quiz', models.ForeignKey(to='quiz.Quiz', db_index=False)),
+                ('user', models.ForeignKey(to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterIndexTogether(
+            name='response',
+            index_together=set([('quiz', 'answered')]),
+        ),
+        migrations.AddField(
+            model_name='sitting',
+            name='response_log',
+            field=models.BinaryField(default=b'', blank=True),
+            preserve_default=True,
+        ),
+    ]
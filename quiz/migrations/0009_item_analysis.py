@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0008_response'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnswerStats',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('selections', models.PositiveIntegerField()),
+                ('rate', models.FloatField()),
+                ('answer', models.ForeignKey(to='quiz.Answer')),
+                ('quiz', models.ForeignKey(to='quiz.Quiz')),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('responses', models.PositiveIntegerField()),
+                ('p_value', models.FloatField()),
+                ('discrimination', models.FloatField(null=True, blank=True)),
+                ('computed', models.DateTimeField()),
+                ('question', models.ForeignKey(to='quiz.Question')),
+                ('quiz', models.ForeignKey(to='quiz.Quiz')),
+            ],
+            options={
+                'verbose_name': 'Question statistics',
+                'verbose_name_plural': 'Question statistics',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='questionstats',
+            unique_together=set([('question', 'quiz')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='answerstats',
+            unique_together=set([('answer', 'quiz')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='response',
+            index_together=set([('quiz', 'sitting_id'), ('quiz', 'answered')]),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('quiz', '0010_quizstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryProgress',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('score', models.PositiveIntegerField(default=0)),
+                ('possible', models.PositiveIntegerField(default=0)),
+                ('category', models.ForeignKey(to='quiz.Category')),
+                ('user', models.ForeignKey(to=settings.AUTH_USER_MODEL, db_index=False)),
+            ],
+            options={
+                'verbose_name': 'Category progress',
+                'verbose_name_plural': 'Category progress',
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='categoryprogress',
+            unique_together=set([('user', 'category')]),
+        ),
+    ]
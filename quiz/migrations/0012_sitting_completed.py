@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.utils import timezone
+
+
+def set_completed(apps, schema_editor):
+    # the time the exams completed so far were completed at is unknown,
+    # they are listed as completed now, most recent first
+    Sitting = apps.get_model('quiz', 'Sitting')
+    Sitting.objects.filter(complete=True, completed=None) \
+        .update(completed=timezone.now())
+
+
+def unset_completed(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0011_categoryprogress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sitting',
+            name='completed',
+            field=models.DateTimeField(null=True, editable=False, blank=True),
+            preserve_default=True,
+        ),
+        migrations.RunPython(set_completed, unset_completed),
+        migrations.AlterIndexTogether(
+            name='sitting',
+            index_together=set([('user', 'complete', 'completed', 'id')]),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('quiz', '0012_sitting_completed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedSitting',
+            fields=[
+                ('id', models.PositiveIntegerField(serialize=False, primary_key=True)),
+                ('question_order', models.BinaryField()),
+                ('incorrect_bitset', models.BinaryField(default=b'', blank=True)),
+                ('current_score', models.PositiveIntegerField(default=0)),
+                ('max_score', models.PositiveIntegerField(default=0)),
+                ('completed', models.DateTimeField(null=True, blank=True)),
+                ('quiz', models.ForeignKey(to='quiz.Quiz')),
+                ('user', models.ForeignKey(to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+    ]
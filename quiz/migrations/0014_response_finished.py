@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def set_finished(apps, schema_editor):
+    # the responses of the sittings which are not in progress any more,
+    # whether they have been deleted or not
+    Response = apps.get_model('quiz', 'Response')
+    Sitting = apps.get_model('quiz', 'Sitting')
+    Response.objects.exclude(sitting_id__in=Sitting.objects.filter(
+        active=True).values('id')).update(finished=True)
+
+
+def unset_finished(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0013_archivedsitting'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='response',
+            name='finished',
+            field=models.BooleanField(default=False),
+            preserve_default=True,
+        ),
+        migrations.RunPython(set_finished, unset_finished),
+    ]
@@ -1,5 +1,22 @@
 # -*- coding: utf-8 -*-
-from django.db import models
+import random
+from datetime import datetime
+
+from django.conf import settings
+from django.db import models, transaction, connection, IntegrityError
+from django.db.models import F
+from django.db.models.signals import m2m_changed, pre_delete, \
+    post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from quiz.content import bump_content_version, get_quiz_content, \
+    bump_catalogue_version
+from quiz.packing import pack_ids, unpack_ids, pack_pairs, unpack_pairs, \
+    bitset_set, bitset_indexes
+
+# number of answers logged on a sitting before they are saved as Responses
+RESPONSE_LOG_SIZE = getattr(settings, 'QUIZ_RESPONSE_LOG_SIZE', 50)
 
 # Uncomment this and "choices" in the Category model
 # to prepopulate the categories
@@ -64,13 +81,54 @@ class Quiz(models.Model):
         help_text="If yes, the result of each attempt " +
         "by a user will be stored")
 
+    # number of questions in the quiz, maintained by the signal handlers
+    # at the bottom of this module
+    question_count = models.PositiveIntegerField(default=0, editable=False)
+
     class Meta:
         verbose_name = "Quiz"
         verbose_name_plural = "Quizzes"
+        # pages of the quizzes of a category
+        index_together = (('category', 'title', 'id'),)
 
     def __unicode__(self):
         return self.title
 
+    def get_question_ids(self):
+        """
+        Returns the list of the IDs of the questions of the quiz, in the
+        order they are set. Read from the cached content of the quiz.
+        """
+        return get_quiz_content(self.id).get_question_ids()
+
+    @classmethod
+    def update_question_counts(cls, quiz_ids):
+        """
+        Recomputes the question_count of the given quizzes
+        and bumps their content version
+        """
+        quiz_ids = set(quiz_ids)
+        for quiz_id in quiz_ids:
+            count = Question.objects.filter(quiz__id=quiz_id).count()
+            cls.objects.filter(id=quiz_id).update(question_count=count)
+        bump_content_version(quiz_ids)
+
+
+class QuestionManager(models.Manager):
+    """
+    Custom manager for the Question model
+    """
+    def for_display(self, ids):
+        """
+        Returns a dict mapping each of the given IDs to its question,
+        with the category and the answers of the questions already
+        fetched, in two queries whatever the number of questions
+        """
+        questions = self.filter(id__in=ids) \
+            .select_related('category') \
+            .prefetch_related('answer_set')
+        return dict((question.id, question) for question in questions)
+
 
 class Question(models.Model):
 
@@ -91,6 +149,8 @@ class Question(models.Model):
         "the question has been answered.",
         verbose_name='Explanation')
 
+    objects = QuestionManager()
+
     class Meta:
         verbose_name = "Question"
         verbose_name_plural = "Questions"
@@ -113,6 +173,11 @@ class Answer(models.Model):
         default=False,
         help_text="Is this a correct answer?")
 
+    class Meta:
+        # answers of a question for display, and its correct ones
+        # for grading
+        index_together = (('question', 'id'), ('question', 'correct'))
+
     def __unicode__(self):
         return self.content
 
@@ -121,30 +186,100 @@ class SittingManager(models.Manager):
     """
     Custom manager for the Sitting model
     """
-    def new_sitting(self, user, quiz):
+    # the quiz passed to the methods below can also be the QuizContent
+    # of the quiz, as returned by quiz.content.get_quiz_content
+
+    def _build_sitting(self, user, quiz, question_ids):
         """
-        Called at the start of a new attempt at a quiz
+        Returns a new, unsaved, sitting of the quiz for the user
         """
+        # a copy, the cached list must not be shuffled
+        question_ids = list(question_ids)
         if quiz.random_order:
-            question_set = quiz.question_set.all().order_by('?')
-        else:
-            question_set = quiz.question_set.all()
+            random.shuffle(question_ids)
 
-        questions = ""
-        for question in question_set:
-            # string of IDs seperated by commas
-            questions = questions + str(question.id) + ","
-
-        new_sitting = self.create(
+        return self.model(
             user=user,
-            quiz=quiz,
-            question_list=questions,
-            incorrect_questions="",
-            current_score="0",
+            quiz_id=quiz.id,
+            question_order=pack_ids(question_ids),
+            max_score=len(question_ids),
+            cursor=0,
+            incorrect_bitset=b'',
+            current_score=0,
             complete=False)
-        new_sitting.save()
+
+    def new_sitting(self, user, quiz):
+        """
+        Called at the start of a new attempt at a quiz
+        """
+        new_sitting = self._build_sitting(
+            user, quiz, quiz.get_question_ids())
+        new_sitting.save(force_insert=True)
         return new_sitting
 
+    def get_or_create_sitting(self, user, quiz):
+        """
+        Returns the incomplete sitting of the user for the quiz, starting
+        a new one if there is none.
+        Two requests racing to start the same quiz get the same sitting,
+        the unique constraint on active rejecting the second insert.
+        """
+        try:
+            return self.get(user=user, quiz_id=quiz.id, active=True)
+        except self.model.DoesNotExist:
+            pass
+        try:
+            with transaction.atomic():
+                return self.new_sitting(user, quiz)
+        except IntegrityError:
+            return self.get(user=user, quiz_id=quiz.id, active=True)
+
+    def bulk_start(self, quiz, users, batch_size=500):
+        """
+        Creates a sitting of the quiz for each of the users who do not
+        already have an incomplete one, ahead of a scheduled start.
+        The questions of the quiz are fetched once and shuffled for
+        each user if needed. The sittings are inserted batch_size at a
+        time.
+        Returns the number of sittings created.
+        """
+        question_ids = quiz.get_question_ids()
+        started = set(self.filter(quiz_id=quiz.id, active=True)
+                      .values_list('user_id', flat=True))
+
+        created = 0
+        batch = []
+        for user in users:
+            if user.pk in started:
+                continue
+            started.add(user.pk)
+            batch.append(self._build_sitting(user, quiz, question_ids))
+            if len(batch) >= batch_size:
+                created += self._bulk_insert(quiz, batch)
+                batch = []
+        if batch:
+            created += self._bulk_insert(quiz, batch)
+        return created
+
+    def _bulk_insert(self, quiz, sittings):
+        """
+        Inserts the sittings, leaving out those of the users who have
+        started the quiz on their own in the meantime.
+        Returns the number of sittings inserted.
+        """
+        try:
+            with transaction.atomic():
+                self.bulk_create(sittings)
+        except IntegrityError:
+            started = set(self.filter(
+                quiz_id=quiz.id, active=True,
+                user__in=[sitting.user_id for sitting in sittings])
+                .values_list('user_id', flat=True))
+            sittings = [sitting for sitting in sittings
+                        if sitting.user_id not in started]
+            self.bulk_create(sittings)
+        return len(sittings)
+
 
 class Sitting(models.Model):
     """
@@ -152,92 +287,173 @@ class Sitting(models.Model):
     Replaces the session system used by anon users.
     user is the logged in user.
     Anon users use sessions to track progress
-    question_list is a list of id's of the unanswered questions.
-    Stored as a textfield to allow >255 chars. quesion_list
-    is in csv format.
 
-    incorrect_questions is a list of id's of the questions answered wrongly
-    current_Score is a total of the answered questions value. Needs to be
-    converted to int when used.
+    question_order is the packed list of the IDs of all the questions
+    of the sitting, in the order they are asked. It is written once when
+    the sitting is created and never modified afterwards.
+    cursor is the position in question_order of the next question to be
+    answered. The questions before it have already been answered.
+
+    incorrect_bitset has one bit per position in question_order, set when
+    the question at that position has been answered wrongly.
+    current_score is a total of the answered questions value.
+    max_score is the number of questions when the sitting was created, so
+    that the result is not affected if the quiz is edited in the meantime.
     complete - True when exam complete. Should only be stored if
     quiz.exam_paper is true, or DB will swell quickly in size
+    active is True while the sitting is incomplete and NULL afterwards.
+    It is unique for a user and a quiz, NULLs not being compared, so that
+    a user has at most one incomplete sitting of a quiz. A sitting which
+    is neither active nor complete is finished but not kept, and waits to
+    be deleted (see QUIZ_DEFER_SITTING_DELETION).
+    completed is the time the sitting was marked complete.
+
+    response_log is the packed list of the answers given and the times
+    they were given at (in seconds since the epoch), for the questions
+    before the cursor. It is written with the cursor, and turned into
+    Response rows once it holds QUIZ_RESPONSE_LOG_SIZE answers and when
+    the sitting is complete. After that it starts with the time of the
+    last answer saved, with an answer ID of 0, for the time taken by
+    the next one.
     """
 
     user = models.ForeignKey('auth.User')  # one user per exam class
     quiz = models.ForeignKey(Quiz)
-    # another awful csv. Always end with a comma
-    question_list = models.TextField()
-    # more awful csv. Always end with a comma
-    incorrect_questions = models.TextField(blank=True)
-    # a string of the score ie 19  convert to int for use
-    # TODO: Why is this a string? Change to int
-    current_score = models.TextField()
+    # packed question IDs, see quiz.packing
+    question_order = models.BinaryField()
+    cursor = models.PositiveIntegerField(default=0)
+    incorrect_bitset = models.BinaryField(blank=True, default=b'')
+    current_score = models.PositiveIntegerField(default=0)
+    max_score = models.PositiveIntegerField(default=0)
     complete = models.BooleanField(default=False, blank=False)
+    active = models.NullBooleanField(default=True, editable=False)
+    completed = models.DateTimeField(null=True, blank=True, editable=False)
+    response_log = models.BinaryField(blank=True, default=b'')
     objects = SittingManager()
 
+    class Meta:
+        unique_together = (('user', 'quiz', 'active'),)
+        # past exams of a user, by completion time
+        index_together = (('user', 'complete', 'completed', 'id'),)
+
+    @property
+    def question_ids(self):
+        """
+        The tuple of all the question IDs of the sitting, in order.
+        Unpacked once per instance.
+        """
+        if getattr(self, '_question_ids_source', None) \
+                is not self.question_order:
+            self._question_ids = unpack_ids(self.question_order)
+            self._question_ids_source = self.question_order
+        return self._question_ids
+
     def get_next_question(self):
         """
         Returns the next question ID (as an integer).
         If no question is found, returns False
         Does NOT remove the question from the front of the list.
         """
-        # TODO: Simplify this method
-        # finds the index of the first comma in the string
-        first_comma = self.question_list.find(',')
-        # if no question number is found
-        if first_comma == -1 or first_comma == 0:
+        question_ids = self.question_ids
+        if self.cursor >= len(question_ids):
             return False
-
-        # up to but not including the first comma
-        qID = self.question_list[:first_comma]
-
-        return qID
+        return question_ids[self.cursor]
 
     def remove_first_question(self):
         """
         Removes the first question on the list.
         Does not return a value.
         """
-        # TODO: Simplify this method (split/join/pop/remove)
-        # finds the index of the first comma in the string
-        first_comma = self.question_list.find(',')
-        # if question number IS found
-        if first_comma != -1 or first_comma != 0:  # TODO: this is always true!
-            # saves from the first number after the first comma
-            temp = self.question_list[first_comma+1:]
-            self.question_list = temp
-        self.save()  # TODO: saving is useless if it hasn't been modified!
+        if self.cursor < len(self.question_ids):
+            self.cursor += 1
+            self.save(update_fields=['cursor'])
 
     def add_to_score(self, points):
         """
         Adds the points to the running total.
         Does not return anything
         """
-        present_score = self.get_current_score()
-        updated_score = present_score + int(points)
-        self.current_score = str(updated_score)
-        self.save()
+        points = int(points)
+        Sitting.objects.filter(pk=self.pk).update(
+            current_score=F('current_score') + points)
+        self.current_score += points
 
     def get_current_score(self):
         """
         returns the current score as an integer
         """
-        return int(self.current_score)
+        return self.current_score
 
     def get_percent_correct(self):
         """
         returns the percentage correct as an integer
         """
+        if not self.max_score:
+            return 0
         return int(round((float(self.current_score) / float(
-            self.quiz.question_set.all().count())) * 100))
+            self.max_score)) * 100))
 
     def mark_quiz_complete(self):
         """
         Changes the quiz to complete.
-        Does not return anything
+        Returns False, changing nothing, if the sitting had already been
+        ended, see _end.
+        """
+        completed = timezone.now()
+        ended = self._end(complete=True, completed=completed)
+        if ended:
+            self.complete = True
+            self.completed = completed
+        return ended
+
+    def mark_quiz_finished(self):
         """
-        self.complete = True
-        self.save()
+        Ends a sitting whose result is not kept, before it is deleted, on
+        the spot or later on by quiz_archive_sittings.
+        Returns False, changing nothing, if the sitting had already been
+        ended, see _end.
+        """
+        return self._end()
+
+    def _end(self, **changes):
+        """
+        Ends the sitting, applying the changes, and saves the responses of
+        its response log. The sitting is ended by a single UPDATE which
+        only applies if it is still active, so that of the requests
+        completing the same sitting at once, only one logs its responses.
+        All the responses of the sitting are then marked as finished.
+        Returns whether the sitting was ended.
+        """
+        responses = self.get_responses()
+        for response in responses:
+            response.finished = True
+        with transaction.atomic():
+            updated = Sitting.objects.filter(pk=self.pk, active=True) \
+                .update(active=None, response_log=b'', **changes)
+            if updated:
+                if len(responses) < self.cursor:
+                    # some were saved while the sitting was being taken
+                    Response.objects.filter(
+                        quiz_id=self.quiz_id, sitting_id=self.pk) \
+                        .update(finished=True)
+                Response.objects.bulk_create(responses)
+        if not updated:
+            return False
+        self.active = None
+        self.response_log = b''
+        return True
+
+    def _position_of(self, question_id):
+        """
+        Returns the position of a question in question_order.
+        The question being answered is the one under the cursor,
+        so the lookup is normally immediate.
+        """
+        question_ids = self.question_ids
+        if self.cursor < len(question_ids) and \
+                question_ids[self.cursor] == question_id:
+            return self.cursor
+        return question_ids.index(question_id)
 
     def add_incorrect_question(self, question):
         """
@@ -246,22 +462,619 @@ class Sitting(models.Model):
         The question object must be passed in
         Does not return anything
         """
-        current_incorrect = self.incorrect_questions
-        question_id = question.id
-        if current_incorrect == "":
-            updated = str(question_id) + ","
+        position = self._position_of(question.id)
+        self.incorrect_bitset = bytes(
+            bitset_set(self.incorrect_bitset, position))
+        self.save(update_fields=['incorrect_bitset'])
+
+    def record_answers(self, responses):
+        """
+        Records the answers to the questions from the cursor onwards, in
+        order. Each response is a tuple of the ID of the answer given,
+        whether it is correct and the time it was given at, in seconds
+        since the epoch.
+        Everything is written in a single UPDATE, which only applies if
+        the cursor has not moved since this sitting was loaded, so that
+        resubmitted answers cannot be counted twice. Once the response log
+        is full, its responses are inserted in the same transaction.
+        Returns True if the answers were recorded, False if they were
+        stale. Either way the instance reflects the stored state afterwards.
+        """
+        responses = list(responses)
+        cursor, current_score, incorrect_bitset, response_log = \
+            self.answered(responses)
+        points = current_score - self.current_score
+
+        logged = []
+        log = unpack_pairs(response_log)
+        if len(log) > RESPONSE_LOG_SIZE:
+            logged = self._responses(cursor, incorrect_bitset, log)
+            response_log = pack_pairs([(0, log[-1][1])])
+
+        changes = {'cursor': F('cursor') + len(responses),
+                   'response_log': response_log}
+        if points:
+            changes['current_score'] = F('current_score') + points
+        if points < len(responses):
+            changes['incorrect_bitset'] = incorrect_bitset
+
+        if logged:
+            with transaction.atomic():
+                updated = Sitting.objects.filter(
+                    pk=self.pk, cursor=self.cursor).update(**changes)
+                if updated:
+                    Response.objects.bulk_create(logged)
         else:
-            updated = current_incorrect + str(question_id) + ","
-        self.incorrect_questions = updated
-        self.save()
+            updated = Sitting.objects.filter(
+                pk=self.pk, cursor=self.cursor).update(**changes)
+
+        if not updated:
+            self.load_answers()
+            return False
+
+        self.cursor = cursor
+        self.current_score = current_score
+        self.incorrect_bitset = incorrect_bitset
+        self.response_log = response_log
+        return True
+
+    def load_answers(self):
+        """
+        Reads the answers recorded so far back from the database
+        """
+        stored = Sitting.objects.filter(pk=self.pk).values(
+            'cursor', 'current_score', 'incorrect_bitset',
+            'response_log')[0]
+        for field, value in stored.items():
+            setattr(self, field, value)
+
+    def answered(self, responses):
+        """
+        Returns the cursor, score, incorrect bitset and response log the
+        sitting would have once the responses from the cursor onwards are
+        recorded (see record_answers). Does not change the sitting.
+        """
+        responses = list(responses)
+        incorrect_bitset = self.incorrect_bitset
+        for position, response in enumerate(responses, self.cursor):
+            if not response[1]:
+                incorrect_bitset = bitset_set(incorrect_bitset, position)
+        if not all(response[1] for response in responses):
+            incorrect_bitset = bytes(incorrect_bitset)
+        response_log = bytes(self.response_log or b'') + pack_pairs(
+            (answer_id, answered) for answer_id, correct, answered
+            in responses)
+        return (self.cursor + len(responses),
+                self.current_score + sum(1 for r in responses if r[1]),
+                incorrect_bitset, response_log)
+
+    def get_responses(self):
+        """
+        Returns the unsaved Responses of the answers in the response log
+        """
+        return self._responses(self.cursor, self.incorrect_bitset,
+                               unpack_pairs(self.response_log))
+
+    def _responses(self, cursor, incorrect_bitset, log):
+        """
+        Returns the unsaved Responses of the answers in the log, which
+        ends at the cursor
+        """
+        question_ids = self.question_ids
+        incorrect = set(bitset_indexes(incorrect_bitset))
+        if settings.USE_TZ:
+            tz = timezone.utc
+        else:
+            tz = None
+
+        responses = []
+        previous = None
+        if log and log[0][0] == 0:
+            # the time of the last answer saved before
+            previous = log[0][1]
+            log = log[1:]
+        for position, (answer_id, answered) in enumerate(
+                log, cursor - len(log)):
+            responses.append(Response(
+                quiz_id=self.quiz_id,
+                user_id=self.user_id,
+                sitting_id=self.id,
+                question_id=question_ids[position],
+                answer_id=answer_id,
+                correct=position not in incorrect,
+                answered=datetime.fromtimestamp(answered, tz),
+                time_taken=None if previous is None
+                else max(answered - previous, 0)))
+            previous = answered
+        return responses
 
     def get_incorrect_questions(self):
         """
         Returns a list of IDs that indicate all the questions that have
         been answered incorrectly in this sitting
         """
-        # string of question IDs as CSV  ie 32,19,22,3,75
-        question_list = self.incorrect_questions
-        # list of strings ie [32,19,22,3,75]
-        split_questions = question_list.split(',')
-        return split_questions
+        question_ids = self.question_ids
+        return [question_ids[position]
+                for position in bitset_indexes(self.incorrect_bitset)
+                if position < len(question_ids)]
+
+    def get_question_results(self):
+        """
+        Returns the questions of the quiz in the order they were asked
+        in this sitting. Each one is a dict with the question, its answers
+        and whether it has been answered incorrectly.
+        The questions are read from the cached content of the quiz.
+        """
+        positions = dict((question_id, position) for position, question_id
+                         in enumerate(self.question_ids))
+        incorrect = set(self.get_incorrect_questions())
+
+        questions = get_quiz_content(self.quiz_id).questions.values()
+        questions = sorted(
+            questions, key=lambda q: positions.get(q.id, len(positions)))
+
+        return [{'question': question,
+                 'answers': question.answers,
+                 'user_was_incorrect': question.id in incorrect}
+                for question in questions]
+
+
+class ArchivedSitting(models.Model):
+    """
+    A completed sitting moved out of the Sitting table, once it is old
+    enough, by quiz_archive_sittings. It keeps the ID of the sitting and
+    its results, but not what it needed while being taken.
+    """
+    id = models.PositiveIntegerField(primary_key=True)
+    user = models.ForeignKey('auth.User')
+    quiz = models.ForeignKey(Quiz)
+    question_order = models.BinaryField()
+    incorrect_bitset = models.BinaryField(blank=True, default=b'')
+    current_score = models.PositiveIntegerField(default=0)
+    max_score = models.PositiveIntegerField(default=0)
+    completed = models.DateTimeField(null=True, blank=True)
+
+    def __unicode__(self):
+        return u'%s' % self.id
+
+    @classmethod
+    def from_sitting(cls, sitting):
+        return cls(id=sitting.id,
+                   user_id=sitting.user_id,
+                   quiz_id=sitting.quiz_id,
+                   question_order=sitting.question_order,
+                   incorrect_bitset=sitting.incorrect_bitset,
+                   current_score=sitting.current_score,
+                   max_score=sitting.max_score,
+                   completed=sitting.completed)
+
+
+class Response(models.Model):
+    """
+    An answer given in a sitting, kept for the analysis of the questions
+    even once the sitting has been deleted. The responses of a sitting are
+    inserted from its response log, QUIZ_RESPONSE_LOG_SIZE at a time while
+    it is being taken and the rest when it ends.
+    finished is set on all of them once the sitting has ended, so that the
+    responses of the sittings in progress or abandoned can be told apart.
+    time_taken is the number of seconds since the previous answer of the
+    sitting was given, unknown for the first one. It is 0 for answers
+    submitted together through the API.
+    """
+    quiz = models.ForeignKey(Quiz, db_index=False)
+    user = models.ForeignKey('auth.User')
+    # not a foreign key, since the sittings are deleted or archived
+    sitting_id = models.PositiveIntegerField()
+    question = models.ForeignKey(Question)
+    answer = models.ForeignKey(Answer, null=True, blank=True,
+                               on_delete=models.SET_NULL)
+    correct = models.BooleanField(default=False)
+    answered = models.DateTimeField()
+    time_taken = models.PositiveIntegerField(null=True, blank=True)
+    finished = models.BooleanField(default=False)
+
+    class Meta:
+        # responses of a quiz over a period, and by sitting for the item
+        # analysis
+        index_together = (('quiz', 'answered'), ('quiz', 'sitting_id'))
+
+    def __unicode__(self):
+        return u'%s: %s' % (self.question_id, self.answer_id)
+
+
+class QuestionStats(models.Model):
+    """
+    The item analysis of a question in a quiz, see quiz.analysis.
+    p_value is the proportion of correct answers, discrimination the
+    correlation between answering the question correctly and the score on
+    the rest of the quiz (None if either never varies).
+    """
+    quiz = models.ForeignKey(Quiz)
+    question = models.ForeignKey(Question)
+    responses = models.PositiveIntegerField()
+    p_value = models.FloatField()
+    discrimination = models.FloatField(null=True, blank=True)
+    computed = models.DateTimeField()
+
+    class Meta:
+        unique_together = (('question', 'quiz'),)
+        verbose_name = "Question statistics"
+        verbose_name_plural = "Question statistics"
+
+    def __unicode__(self):
+        return u'%s (%s)' % (self.question, self.quiz)
+
+
+class AnswerStats(models.Model):
+    """
+    How often an answer was chosen in a quiz, see quiz.analysis.
+    rate is the proportion of the responses to its question.
+    """
+    quiz = models.ForeignKey(Quiz)
+    answer = models.ForeignKey(Answer)
+    selections = models.PositiveIntegerField()
+    rate = models.FloatField()
+
+    class Meta:
+        unique_together = (('answer', 'quiz'),)
+
+    def __unicode__(self):
+        return u'%s (%s)' % (self.answer, self.quiz)
+
+
+class QuizStatsManager(models.Manager):
+
+    def record(self, quiz_id, percent):
+        """
+        Adds the result of a completed sitting, in percent, to the
+        statistics of the quiz, in a single UPDATE once they exist
+        """
+        changes = {
+            'attempts': F('attempts') + 1,
+            'percent_sum': F('percent_sum') + percent,
+            'percent_sum_squares': F('percent_sum_squares') +
+            percent * percent,
+        }
+        bucket = 'bucket_%d' % QuizStats.bucket_of(percent)
+        changes[bucket] = F(bucket) + 1
+        if self.filter(quiz_id=quiz_id).update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                self.create(quiz_id=quiz_id)
+        except IntegrityError:
+            # created by a concurrent request
+            pass
+        self.filter(quiz_id=quiz_id).update(**changes)
+
+    def rebuild(self, quiz_id, chunk_size=10000):
+        """
+        Recomputes the statistics of the quiz from its completed sittings,
+        archived or not, read chunk_size at a time. Results recorded while
+        it runs may be missed, so run it when the quiz is not being taken.
+        Only the sittings of exam papers are kept once complete, so the
+        statistics of other quizzes cannot be rebuilt. The sittings
+        archived to files by quiz_archive_sittings are not counted either.
+        """
+        stats = QuizStats(quiz_id=quiz_id)
+        querysets = (ArchivedSitting.objects.filter(quiz_id=quiz_id),
+                     Sitting.objects.filter(quiz_id=quiz_id, complete=True))
+        for queryset in querysets:
+            last_id = 0
+            while True:
+                sittings = list(queryset.filter(id__gt=last_id)
+                                .order_by('id')
+                                .values_list('id', 'current_score',
+                                             'max_score')[:chunk_size])
+                if not sittings:
+                    break
+                for sitting_id, current_score, max_score in sittings:
+                    percent = Sitting(
+                        current_score=current_score,
+                        max_score=max_score).get_percent_correct()
+                    stats.add(percent)
+                last_id = sittings[-1][0]
+
+        with transaction.atomic():
+            self.filter(quiz_id=quiz_id).delete()
+            stats.save(force_insert=True)
+        return stats
+
+
+class QuizStats(models.Model):
+    """
+    Running totals of the results of the completed sittings of a quiz,
+    updated when a sitting is completed, so that the mean, variance and
+    percentiles of the scores are read from a single row. All the
+    sittings are counted, including those of the quizzes which are not
+    exam papers, which are not kept once complete.
+    The scores are percentages. bucket_N counts the sittings scoring from
+    10 * N to 10 * N + 9 percent, 100 percent included in bucket_9.
+    """
+    quiz = models.OneToOneField(Quiz, related_name='stats')
+    attempts = models.PositiveIntegerField(default=0)
+    percent_sum = models.BigIntegerField(default=0)
+    percent_sum_squares = models.BigIntegerField(default=0)
+    bucket_0 = models.PositiveIntegerField(default=0)
+    bucket_1 = models.PositiveIntegerField(default=0)
+    bucket_2 = models.PositiveIntegerField(default=0)
+    bucket_3 = models.PositiveIntegerField(default=0)
+    bucket_4 = models.PositiveIntegerField(default=0)
+    bucket_5 = models.PositiveIntegerField(default=0)
+    bucket_6 = models.PositiveIntegerField(default=0)
+    bucket_7 = models.PositiveIntegerField(default=0)
+    bucket_8 = models.PositiveIntegerField(default=0)
+    bucket_9 = models.PositiveIntegerField(default=0)
+    objects = QuizStatsManager()
+
+    class Meta:
+        verbose_name = "Quiz statistics"
+        verbose_name_plural = "Quiz statistics"
+
+    def __unicode__(self):
+        return u'%s' % self.quiz
+
+    @staticmethod
+    def bucket_of(percent):
+        return min(max(int(percent), 0) // 10, 9)
+
+    @property
+    def buckets(self):
+        """
+        The list of the number of sittings in each bucket
+        """
+        return [getattr(self, 'bucket_%d' % i) for i in range(10)]
+
+    def add(self, percent):
+        """
+        Adds a result to the instance, without saving it
+        """
+        self.attempts += 1
+        self.percent_sum += percent
+        self.percent_sum_squares += percent * percent
+        bucket = 'bucket_%d' % self.bucket_of(percent)
+        setattr(self, bucket, getattr(self, bucket) + 1)
+
+    def mean(self):
+        """
+        Returns the mean score in percent, None if there is no result
+        """
+        if not self.attempts:
+            return None
+        return float(self.percent_sum) / self.attempts
+
+    def variance(self):
+        """
+        Returns the variance of the scores, None if there is no result
+        """
+        if not self.attempts:
+            return None
+        mean = self.mean()
+        return max(float(self.percent_sum_squares) / self.attempts -
+                   mean * mean, 0.0)
+
+    def percentile(self, rank):
+        """
+        Returns an estimate of the score below which rank percent of the
+        results fall, interpolated within its bucket. None if there is no
+        result.
+        """
+        if not self.attempts:
+            return None
+        target = self.attempts * rank / 100.0
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            if count and seen + count >= target:
+                width = 11 if i == 9 else 10
+                return min(10 * i + width * (target - seen) / count, 100.0)
+            seen += count
+        return 100.0
+
+    def pass_rate(self, pass_mark):
+        """
+        Returns the proportion of the results of at least pass_mark
+        percent, which is rounded down to a multiple of 10 (90 at most).
+        None if there is no result.
+        """
+        if not self.attempts:
+            return None
+        passed = sum(self.buckets[self.bucket_of(pass_mark):])
+        return float(passed) / self.attempts
+
+
+class CategoryProgressManager(models.Manager):
+
+    def record_sitting(self, sitting, quiz):
+        """
+        Adds the results of a completed sitting to the progress of its
+        user in the categories of its questions, with one query to look
+        the categories up and one upsert.
+        quiz is the cached content of the quiz, see quiz.content
+        """
+        incorrect = set(sitting.get_incorrect_questions())
+        totals = {}
+        for question_id in sitting.question_ids:
+            category = quiz.get_question(question_id).category
+            if category is None:
+                continue
+            score, possible = totals.get(category, (0, 0))
+            if question_id not in incorrect:
+                score += 1
+            totals[category] = (score, possible + 1)
+        if not totals:
+            return
+
+        category_ids = dict(Category.objects.filter(name__in=list(totals))
+                            .values_list('name', 'id'))
+        self.add_scores([
+            (sitting.user_id, category_ids[name], score, possible)
+            for name, (score, possible) in totals.items()
+            if name in category_ids])
+
+    def add_scores(self, rows):
+        """
+        Adds the scores to the progress, given as (user ID, category ID,
+        score, possible) tuples, creating the progress that does not
+        exist yet. A single INSERT ... ON CONFLICT (or ON DUPLICATE KEY)
+        statement where the database supports it.
+        """
+        if not rows:
+            return
+        suffix = self._upsert_suffix()
+        if suffix is None:
+            for user_id, category_id, score, possible in rows:
+                self._add_score(user_id, category_id, score, possible)
+            return
+
+        qn = connection.ops.quote_name
+        sql = 'INSERT INTO %s (%s, %s, %s, %s) VALUES %s %s' % (
+            qn(self.model._meta.db_table), qn('user_id'),
+            qn('category_id'), qn('score'), qn('possible'),
+            ', '.join(['(%s, %s, %s, %s)'] * len(rows)), suffix)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [value for row in rows for value in row])
+
+    def _upsert_suffix(self):
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        if connection.vendor == 'mysql':
+            return ('ON DUPLICATE KEY UPDATE %(score)s = %(score)s + '
+                    'VALUES(%(score)s), %(possible)s = %(possible)s + '
+                    'VALUES(%(possible)s)') % {
+                        'score': qn('score'), 'possible': qn('possible')}
+        if connection.vendor == 'postgresql':
+            supported = connection.pg_version >= 90500
+        elif connection.vendor == 'sqlite':
+            import sqlite3
+            supported = sqlite3.sqlite_version_info >= (3, 24, 0)
+        else:
+            supported = False
+        if not supported:
+            return None
+        return ('ON CONFLICT (%(user)s, %(category)s) DO UPDATE SET '
+                '%(score)s = %(table)s.%(score)s + excluded.%(score)s, '
+                '%(possible)s = %(table)s.%(possible)s + '
+                'excluded.%(possible)s') % {
+                    'table': table, 'user': qn('user_id'),
+                    'category': qn('category_id'), 'score': qn('score'),
+                    'possible': qn('possible')}
+
+    def _add_score(self, user_id, category_id, score, possible):
+        changes = {'score': F('score') + score,
+                   'possible': F('possible') + possible}
+        progress = self.filter(user_id=user_id, category_id=category_id)
+        if progress.update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                self.create(user_id=user_id, category_id=category_id,
+                            score=score, possible=possible)
+        except IntegrityError:
+            # created by a concurrent request
+            progress.update(**changes)
+
+
+class CategoryProgress(models.Model):
+    """
+    The number of questions of a category a user has answered correctly,
+    out of the number answered, in all the quizzes completed.
+    Updated when a sitting is completed, see record_sitting.
+    """
+    user = models.ForeignKey('auth.User', db_index=False)
+    category = models.ForeignKey(Category)
+    score = models.PositiveIntegerField(default=0)
+    possible = models.PositiveIntegerField(default=0)
+    objects = CategoryProgressManager()
+
+    class Meta:
+        # also the index of the progress of a user
+        unique_together = (('user', 'category'),)
+        verbose_name = "Category progress"
+        verbose_name_plural = "Category progress"
+
+    def __unicode__(self):
+        return u'%s: %d/%d' % (self.category_id, self.score, self.possible)
+
+    def get_percent_correct(self):
+        """
+        returns the percentage correct as an integer
+        """
+        if not self.possible:
+            return 0
+        return int(round(100.0 * self.score / self.possible))
+
+
+@receiver(m2m_changed, sender=Question.quiz.through)
+def question_quiz_changed(sender, instance, action, reverse, pk_set,
+                          **kwargs):
+    """
+    Keeps Quiz.question_count up to date when questions are added to
+    or removed from quizzes, from either side of the relation
+    """
+    if action == 'pre_clear' and not reverse:
+        # the quizzes of the question are lost once cleared
+        instance._cleared_quiz_ids = list(
+            instance.quiz.values_list('id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if reverse:
+        quiz_ids = [instance.pk]
+    elif action == 'post_clear':
+        quiz_ids = instance.__dict__.pop('_cleared_quiz_ids', [])
+    else:
+        quiz_ids = pk_set
+    Quiz.update_question_counts(quiz_ids)
+
+
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+def quiz_changed(sender, instance, **kwargs):
+    bump_content_version([instance.id])
+    bump_catalogue_version()
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, created, **kwargs):
+    # a new question is not part of any quiz yet
+    if not created:
+        bump_content_version(instance.quiz.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def answer_changed(sender, instance, **kwargs):
+    bump_content_version(
+        Question.quiz.through.objects.filter(
+            question_id=instance.question_id)
+        .values_list('quiz_id', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    bump_catalogue_version()
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, **kwargs):
+    bump_catalogue_version()
+    # the name of the category is shown with the questions
+    if not created:
+        bump_content_version(
+            Question.quiz.through.objects.filter(
+                question__category=instance)
+            .values_list('quiz_id', flat=True))
+
+
+@receiver(pre_delete, sender=Question)
+def question_pre_delete(sender, instance, **kwargs):
+    # the relation rows are deleted along with the question without
+    # sending m2m_changed
+    instance._deleted_quiz_ids = list(
+        instance.quiz.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Question)
+def question_post_delete(sender, instance, **kwargs):
+    Quiz.update_question_counts(
+        instance.__dict__.pop('_deleted_quiz_ids', []))
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers for the compact binary formats stored on a Sitting.
+
+The question order is a packed array of little-endian unsigned 32 bit
+integers (4 bytes per question id). The incorrect answers are a bitset
+with one bit per position in that array.
+The response log is a packed array of pairs of such integers.
+"""
+import struct
+
+_ID_FORMAT = '<%dI'
+_ID_SIZE = 4
+
+
+def pack_ids(ids):
+    """
+    Packs a sequence of integer ids into a byte string
+    """
+    ids = [int(i) for i in ids]
+    return struct.pack(_ID_FORMAT % len(ids), *ids)
+
+
+def unpack_ids(data):
+    """
+    Returns the tuple of integer ids packed into data.
+    data can be any buffer returned by the database driver.
+    """
+    if not data:
+        return ()
+    data = bytes(data)
+    return struct.unpack(_ID_FORMAT % (len(data) // _ID_SIZE), data)
+
+
+def empty_bitset(size):
+    """
+    Returns a bitset that can hold size bits, all unset
+    """
+    return bytearray((size + 7) // 8)
+
+
+def bitset_set(bitset, index):
+    """
+    Returns a copy of the bitset with the bit at index set.
+    The bitset is grown if needed.
+    """
+    bitset = bytearray(bitset or b'')
+    byte = index >> 3
+    if byte >= len(bitset):
+        bitset.extend(bytearray(byte + 1 - len(bitset)))
+    bitset[byte] |= 1 << (index & 7)
+    return bitset
+
+
+def bitset_indexes(bitset):
+    """
+    Returns the list of the indexes of all the bits set, in order
+    """
+    indexes = []
+    for byte, value in enumerate(bytearray(bitset or b'')):
+        if not value:
+            continue
+        for bit in range(8):
+            if value & (1 << bit):
+                indexes.append((byte << 3) + bit)
+    return indexes
+
+
+def pack_pairs(pairs):
+    """
+    Packs a sequence of pairs of unsigned integers into a byte string
+    """
+    return pack_ids([value for pair in pairs for value in pair])
+
+
+def unpack_pairs(data):
+    """
+    Returns the list of the pairs packed into data
+    """
+    values = unpack_ids(data)
+    return list(zip(values[0::2], values[1::2]))
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Keyset pagination of the category and quiz listings.
+
+A page is read with a WHERE on the ordering key instead of an OFFSET, so
+that page N costs the same as page 1 as long as the key is indexed.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.encoding import force_bytes
+from django.utils.functional import cached_property
+from django.utils.http import urlencode
+
+from quiz.content import get_catalogue_version
+
+COUNT_KEY = 'quiz:count:%d:%s'
+
+
+class KeysetPage(object):
+    """
+    A page of a queryset ordered by keys, a tuple of field names whose
+    values are unique together, starting after the given values of those
+    keys (or at the beginning if after is empty). Keys starting with '-'
+    are in descending order, as in order_by.
+    It is evaluated lazily, so that the database is only read when the
+    template fragment showing the page is not cached.
+    """
+    def __init__(self, queryset, keys, after, size, search=''):
+        self.queryset = queryset
+        self.keys = keys
+        self.after = tuple(after)
+        self.size = size
+        self.search = search
+
+    @cached_property
+    def _rows(self):
+        queryset = self.queryset.order_by(*self.keys)
+        if len(self.after) == len(self.keys):
+            queryset = queryset.filter(self._after_filter())
+        return list(queryset[:self.size + 1])
+
+    def _after_filter(self):
+        """
+        Selects the rows which keys come after the after values:
+        (k1 > a1) OR (k1 = a1 AND k2 > a2) OR ...
+        """
+        condition = Q()
+        for i, key in enumerate(self.keys):
+            if key.startswith('-'):
+                term = Q(**{key[1:] + '__lt': self.after[i]})
+            else:
+                term = Q(**{key + '__gt': self.after[i]})
+            for previous, value in zip(self.keys[:i], self.after[:i]):
+                term &= Q(**{previous.lstrip('-'): value})
+            condition |= term
+        return condition
+
+    @property
+    def items(self):
+        return self._rows[:self.size]
+
+    @property
+    def has_next(self):
+        return len(self._rows) > self.size
+
+    @property
+    def next_query(self):
+        """
+        The query string of the next page
+        """
+        last = self.items[-1]
+        query = [('after', getattr(last, key.lstrip('-')))
+                 for key in self.keys]
+        if self.search:
+            query.append(('q', self.search))
+        return urlencode(query)
+
+    @property
+    def count(self):
+        """
+        The number of rows of all the pages. Cached until the catalogue
+        changes, instead of counting them for each page.
+        """
+        version = get_catalogue_version()
+        # the parameters are hashed apart from the SQL, which str() of the
+        # query would fail to encode when a search is not ASCII
+        sql, params = self.queryset.query.sql_with_params()
+        digest = hashlib.md5(force_bytes(sql))
+        for param in params:
+            digest.update(b'\0' + force_bytes(param))
+        key = COUNT_KEY % (version, digest.hexdigest())
+        count = cache.get(key)
+        if count is None:
+            count = self.queryset.count()
+            cache.set(key, count)
+        return count
@@ -1,15 +1,28 @@
 from django import template
-from quiz.models import Answer
+from quiz.content import shuffle_answers
+from quiz.models import Question
 
 register = template.Library()
 
 
+def _answers(question):
+    """
+    Returns the answers of a question, which can either be a Question or
+    a question of the cached content of a quiz (see quiz.content)
+    """
+    if isinstance(question, Question):
+        return question.answer_set.all()
+    return question.answers
+
+
 @register.inclusion_tag('answers_for_question.html', takes_context=True)
-def answers_for_question(context, question, quiz):
+def answers_for_question(context, question, quiz, sitting=None):
     """
     Displays the possible answers to a question
+    Given a sitting, the answers are shuffled the same way every time
+    the question is displayed in that sitting
     """
-    answers = Answer.objects.filter(question__id=question.id).order_by('?')
+    answers = shuffle_answers(_answers(question), question.id, sitting)
     return {'answers': answers, 'quiz': quiz}
 
 
@@ -19,7 +32,7 @@ def correct_answer(context, previous):
     processes the correct answer based on the previous question dict
     """
     q = previous['previous_question']
-    answers = Answer.objects.filter(question__id=q.id)
+    answers = _answers(q)
     return {'answers': answers, }
 
 
@@ -28,7 +41,7 @@ def correct_answer_for_all(context, question):
     """
     processes the correct answer based on a given question object
     """
-    answers = Answer.objects.filter(question__id=question.id)
+    answers = _answers(question)
     return {'answers': answers, }
 
 
@@ -39,9 +52,8 @@ def correct_answer_for_all_with_users_incorrect(context,
     processes the correct answer based on a given question object
     if the answer is incorrect, informs the user
     """
-    answers = Answer.objects.filter(question__id=question.id)
-    question_id = str(question.id)
-    if question_id in incorrect_list:
+    answers = _answers(question)
+    if question.id in incorrect_list:
         user_was_incorrect = True
     else:
         user_was_incorrect = False
@@ -55,7 +67,7 @@ def user_previous_exam(context, exam):
     """
     title = exam.quiz.title
     final_score = exam.current_score
-    possible_score = exam.quiz.question_set.count()
-    percent = int(round((float(final_score) / float(possible_score)) * 100))
+    possible_score = exam.max_score
+    percent = exam.get_percent_correct()
     return {'title': title, 'score': final_score,
             'possible': possible_score, 'percent': percent, }
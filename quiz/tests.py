@@ -0,0 +1,787 @@
+# -*- coding: utf-8 -*-
+import csv
+import json
+import os
+import time
+import zlib
+from unittest import skipIf
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import setup_test_template_loader, \
+    restore_template_loaders
+
+from quiz import analysis, buffer, importer, models
+from quiz.export import FIELDS, export_results
+from quiz.content import bump_pending_versions, get_quiz_content
+from quiz.models import Category, Quiz, Question, Answer, Sitting, \
+    Response, QuestionStats, QuizStats, ArchivedSitting
+from quiz.packing import pack_ids, unpack_ids, empty_bitset, bitset_set, \
+    bitset_indexes, pack_pairs, unpack_pairs
+from quiz.pagination import KeysetPage
+from quiz.views import complete_sitting
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), 'templates')
+
+
+def make_quiz(questions, **kwargs):
+    """
+    Returns a new quiz with the given number of questions, each with a
+    correct answer and two incorrect ones
+    """
+    quiz = Quiz.objects.create(title='Quiz', **kwargs)
+    category = Category.objects.create(name='Category %d' % quiz.id)
+    for i in range(questions):
+        Question.objects.create(content='Question %d' % i,
+                                category=category)
+    question_ids = list(Question.objects.filter(category=category)
+                        .values_list('id', flat=True))
+    Answer.objects.bulk_create([
+        Answer(question_id=question_id, content='Answer %d' % i,
+               correct=i == 0)
+        for question_id in question_ids for i in range(3)])
+    quiz.question_set.add(*question_ids)
+    # as at the end of the request creating the quiz, since the test is run
+    # in a transaction
+    bump_pending_versions(None)
+    return Quiz.objects.get(id=quiz.id)
+
+
+def setup_templates():
+    """
+    Loads the templates of the app under the names the views use, with a
+    base template of the site, until restore_template_loaders is called
+    """
+    templates = {'base.html': '{% block article %}{% endblock %}'}
+    for name in os.listdir(TEMPLATE_DIR):
+        if name.endswith('.html'):
+            with open(os.path.join(TEMPLATE_DIR, name)) as template:
+                # the inclusion tags load them without the prefix
+                templates[name] = templates['quiz/' + name] = \
+                    template.read()
+    setup_test_template_loader(templates)
+
+
+def responses(sitting, correct=True):
+    """
+    Returns the responses answering the questions of the sitting from its
+    cursor onwards, correctly or not
+    """
+    answered = int(time.time())
+    return [(answer.id, answer.correct, answered) for answer in [
+        Answer.objects.filter(question_id=question_id, correct=correct)[0]
+        for question_id in sitting.question_ids[sitting.cursor:]]]
+
+
+class PackingTest(TestCase):
+
+    def test_ids(self):
+        self.assertEqual(unpack_ids(pack_ids([3, 1, 2 ** 32 - 1])),
+                         (3, 1, 2 ** 32 - 1))
+        self.assertEqual(len(pack_ids(range(10))), 40)
+        self.assertEqual(unpack_ids(b''), ())
+        self.assertEqual(unpack_ids(None), ())
+
+    def test_bitset(self):
+        bitset = empty_bitset(10)
+        self.assertEqual(len(bitset), 2)
+        self.assertEqual(bitset_indexes(bitset), [])
+        bitset = bitset_set(bitset, 9)
+        bitset = bitset_set(bitset, 0)
+        self.assertEqual(bitset_indexes(bitset), [0, 9])
+        # grown as needed
+        self.assertEqual(bitset_indexes(bitset_set(b'', 20)), [20])
+
+    def test_pairs(self):
+        pairs = [(1, 1400000000), (7, 1400000010)]
+        self.assertEqual(unpack_pairs(pack_pairs(pairs)), pairs)
+        self.assertEqual(unpack_pairs(b''), [])
+
+
+class SittingTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('user', 'user@example.com',
+                                             'password')
+        self.quiz = make_quiz(4, exam_paper=True)
+
+    def test_record_answers(self):
+        sitting = Sitting.objects.new_sitting(self.user, self.quiz)
+        answers = responses(sitting, correct=False)[:1] + \
+            responses(sitting)[1:3]
+        self.assertTrue(sitting.record_answers(answers))
+
+        sitting = Sitting.objects.get(pk=sitting.pk)
+        self.assertEqual(sitting.cursor, 3)
+        self.assertEqual(sitting.current_score, 2)
+        self.assertEqual(sitting.get_incorrect_questions(),
+                         [sitting.question_ids[0]])
+        self.assertEqual(len(unpack_pairs(sitting.response_log)), 3)
+
+    def test_record_answers_stale(self):
+        """
+        Answers submitted twice, by requests which loaded the sitting at
+        the same cursor, are only recorded once
+        """
+        sitting = Sitting.objects.new_sitting(self.user, self.quiz)
+        first = Sitting.objects.get(pk=sitting.pk)
+        second = Sitting.objects.get(pk=sitting.pk)
+        self.assertTrue(first.record_answers(responses(first)[:2]))
+        self.assertFalse(second.record_answers(responses(second)[:2]))
+
+        # the stale instance is brought up to date
+        self.assertEqual(second.cursor, 2)
+        self.assertEqual(second.current_score, 2)
+        sitting = Sitting.objects.get(pk=sitting.pk)
+        self.assertEqual(sitting.cursor, 2)
+        self.assertEqual(sitting.current_score, 2)
+        self.assertEqual(len(unpack_pairs(sitting.response_log)), 2)
+
+    def test_response_log_size(self):
+        """
+        The response log is saved as Responses once it is full
+        """
+        size = models.RESPONSE_LOG_SIZE
+        models.RESPONSE_LOG_SIZE = 2
+        try:
+            sitting = Sitting.objects.new_sitting(self.user, self.quiz)
+            for response in responses(sitting):
+                sitting.record_answers([response])
+        finally:
+            models.RESPONSE_LOG_SIZE = size
+
+        self.assertEqual(Response.objects.filter(
+            sitting_id=sitting.id, finished=False).count(), 3)
+        sitting = Sitting.objects.get(pk=sitting.pk)
+        self.assertEqual(len(sitting.get_responses()), 1)
+        self.assertTrue(sitting.mark_quiz_complete())
+        self.assertEqual(sorted(Response.objects.filter(
+            sitting_id=sitting.id, finished=True)
+            .values_list('question_id', flat=True)),
+            sorted(sitting.question_ids))
+
+    def test_get_or_create_sitting(self):
+        sitting = Sitting.objects.get_or_create_sitting(self.user, self.quiz)
+        self.assertEqual(
+            Sitting.objects.get_or_create_sitting(self.user, self.quiz).pk,
+            sitting.pk)
+
+    def test_get_or_create_sitting_race(self):
+        """
+        A request which does not find the sitting another one has just
+        created gets it once its own insert is rejected
+        """
+        sitting = Sitting.objects.new_sitting(self.user, self.quiz)
+        get = Sitting.objects.get
+        calls = []
+
+        def get_after_insert(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                # the sitting had not been inserted yet
+                raise Sitting.DoesNotExist
+            return get(**kwargs)
+
+        Sitting.objects.get = get_after_insert
+        try:
+            found = Sitting.objects.get_or_create_sitting(self.user,
+                                                          self.quiz)
+        finally:
+            del Sitting.objects.get
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(found.pk, sitting.pk)
+        self.assertEqual(Sitting.objects.filter(
+            user=self.user, quiz=self.quiz).count(), 1)
+
+    def test_mark_quiz_complete_once(self):
+        sitting = Sitting.objects.new_sitting(self.user, self.quiz)
+        sitting.record_answers(responses(sitting))
+        first = Sitting.objects.get(pk=sitting.pk)
+        second = Sitting.objects.get(pk=sitting.pk)
+        self.assertTrue(first.mark_quiz_complete())
+        self.assertFalse(second.mark_quiz_complete())
+        self.assertEqual(Response.objects.filter(
+            sitting_id=sitting.id).count(), 4)
+
+
+class InterruptedRequest(Exception):
+    pass
+
+
+class InterruptedBuffer(object):
+    """
+    The answer buffer of a request interrupted right after it has added
+    an answer
+    """
+    def __init__(self, cache):
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self.cache, name)
+
+    def add(self, key, *args):
+        added = self.cache.add(key, *args)
+        if key.startswith(buffer.ANSWER_KEY.split('%')[0]):
+            raise InterruptedRequest
+        return added
+
+
+class BufferTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.answer_buffer = buffer.ANSWER_BUFFER
+        buffer.ANSWER_BUFFER = 'default'
+        user = User.objects.create_user('user', 'user@example.com',
+                                        'password')
+        self.sitting = Sitting.objects.new_sitting(
+            user, make_quiz(4, exam_paper=True))
+
+    def tearDown(self):
+        buffer.ANSWER_BUFFER = self.answer_buffer
+
+    def answers(self, sitting):
+        return [Answer.objects.filter(question_id=question_id,
+                                      correct=True)[0]
+                for question_id in sitting.question_ids[sitting.cursor:]]
+
+    def reload(self):
+        sitting = Sitting.objects.get(pk=self.sitting.pk)
+        buffer.load_buffered_answers(sitting)
+        return sitting
+
+    def test_save_answers(self):
+        self.assertTrue(buffer.save_answers(
+            self.sitting, self.answers(self.sitting)[:2]))
+        self.assertEqual(Sitting.objects.get(pk=self.sitting.pk).cursor, 0)
+        sitting = self.reload()
+        self.assertEqual(sitting.cursor, 2)
+        self.assertEqual(sitting.current_score, 2)
+
+        self.assertEqual(buffer.flush_answers(), 2)
+        sitting = Sitting.objects.get(pk=self.sitting.pk)
+        self.assertEqual(sitting.cursor, 2)
+        self.assertEqual(sitting.current_score, 2)
+
+    def test_save_answers_stale(self):
+        stale = Sitting.objects.get(pk=self.sitting.pk)
+        answers = self.answers(self.sitting)[:1]
+        self.assertTrue(buffer.save_answers(self.sitting, answers))
+        self.assertFalse(buffer.save_answers(stale, answers))
+        self.assertEqual(stale.cursor, 1)
+        self.assertEqual(buffer.flush_answers(), 1)
+        self.assertEqual(Sitting.objects.get(pk=self.sitting.pk)
+                         .current_score, 1)
+
+    def test_interrupted(self):
+        """
+        An answer buffered by a request interrupted before it completes is
+        kept, and the next answers are buffered after it
+        """
+        answers = self.answers(self.sitting)
+        answer_buffer = buffer._buffer
+        buffer._buffer = lambda: InterruptedBuffer(answer_buffer())
+        try:
+            self.assertRaises(InterruptedRequest, buffer.save_answers,
+                              self.sitting, answers[:1])
+        finally:
+            buffer._buffer = answer_buffer
+
+        sitting = self.reload()
+        self.assertEqual(sitting.cursor, 1)
+        self.assertTrue(buffer.save_answers(sitting, answers[1:3]))
+        self.assertEqual(self.reload().cursor, 3)
+        self.assertEqual(buffer.flush_active_sittings(), 3)
+        self.assertEqual(Sitting.objects.get(pk=self.sitting.pk).cursor, 3)
+
+    def test_flush_sitting(self):
+        buffer.save_answers(self.sitting, self.answers(self.sitting))
+        buffer.flush_sitting(self.sitting)
+        self.assertEqual(self.sitting.cursor, 4)
+        self.assertEqual(Sitting.objects.get(pk=self.sitting.pk).cursor, 4)
+        self.assertEqual(cache.get(buffer.END_KEY % self.sitting.id), None)
+        self.assertEqual(cache.get(buffer.ANSWER_KEY % (self.sitting.id, 0)),
+                         None)
+
+
+@skipIf(analysis.numpy is None, 'The item analysis requires NumPy')
+class ItemAnalysisTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.quiz = make_quiz(2, exam_paper=True)
+
+    def take(self, username, correct):
+        user = User.objects.create_user(username, '', 'password')
+        sitting = Sitting.objects.new_sitting(user, self.quiz)
+        sitting.record_answers(responses(sitting, correct))
+        sitting.mark_quiz_complete()
+
+    def test_finished_sittings(self):
+        """
+        The responses saved by a sitting which has not ended are left out
+        """
+        self.take('first', True)
+        self.take('second', False)
+        user = User.objects.create_user('third', '', 'password')
+        sitting = Sitting.objects.new_sitting(user, self.quiz)
+        Response.objects.bulk_create(sitting._responses(
+            2, sitting.incorrect_bitset, [
+                (answer_id, answered) for answer_id, correct, answered
+                in responses(sitting)]))
+
+        self.assertEqual(analysis.analyse_quiz(self.quiz), 2)
+        stats = QuestionStats.objects.filter(quiz=self.quiz)
+        self.assertEqual(len(stats), 2)
+        for question_stats in stats:
+            self.assertEqual(question_stats.responses, 2)
+            self.assertEqual(question_stats.p_value, 0.5)
+            self.assertAlmostEqual(question_stats.discrimination, 1.0)
+
+
+class QuizStatsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('user', 'user@example.com',
+                                             'password')
+
+    def test_statistics(self):
+        stats = QuizStats(quiz_id=1)
+        self.assertEqual(stats.mean(), None)
+        self.assertEqual(stats.percentile(50), None)
+        for percent in (100, 50, 50, 0):
+            stats.add(percent)
+        self.assertEqual(stats.attempts, 4)
+        self.assertEqual(stats.buckets, [1, 0, 0, 0, 0, 2, 0, 0, 0, 1])
+        self.assertEqual(stats.mean(), 50.0)
+        self.assertEqual(stats.variance(), 1250.0)
+        self.assertEqual(stats.percentile(50), 55.0)
+        self.assertEqual(stats.percentile(100), 100.0)
+        self.assertEqual(stats.pass_rate(50), 0.75)
+
+    def test_record(self):
+        quiz = make_quiz(2)
+        QuizStats.objects.record(quiz.id, 100)
+        QuizStats.objects.record(quiz.id, 50)
+        stats = QuizStats.objects.get(quiz=quiz)
+        self.assertEqual(stats.attempts, 2)
+        self.assertEqual(stats.mean(), 75.0)
+        self.assertEqual(stats.bucket_5, 1)
+
+    def test_completed_sittings(self):
+        """
+        The results of every quiz are recorded, including those which are
+        not exam papers, whose sittings are deleted
+        """
+        for exam_paper in (True, False):
+            quiz = make_quiz(2, exam_paper=exam_paper)
+            sitting = Sitting.objects.new_sitting(self.user, quiz)
+            sitting.record_answers(responses(sitting)[:1] +
+                                   responses(sitting, correct=False)[1:])
+            complete_sitting(sitting, get_quiz_content(quiz.id))
+            stats = QuizStats.objects.get(quiz=quiz)
+            self.assertEqual(stats.attempts, 1)
+            self.assertEqual(stats.mean(), 50.0)
+            self.assertEqual(Sitting.objects.filter(quiz=quiz).exists(),
+                             exam_paper)
+
+    def test_rebuild(self):
+        quiz = make_quiz(2, exam_paper=True)
+        sitting = Sitting.objects.new_sitting(self.user, quiz)
+        sitting.record_answers(responses(sitting))
+        sitting.mark_quiz_complete()
+        ArchivedSitting.objects.create(
+            id=sitting.id + 1, user=self.user, quiz=quiz,
+            question_order=sitting.question_order, current_score=0,
+            max_score=2)
+        # in progress
+        Sitting.objects.new_sitting(User.objects.create_user('other'), quiz)
+        QuizStats.objects.record(quiz.id, 10)
+
+        stats = QuizStats.objects.rebuild(quiz.id, chunk_size=1)
+        self.assertEqual(stats.attempts, 2)
+        self.assertEqual(stats.buckets, [1, 0, 0, 0, 0, 0, 0, 0, 0, 1])
+        self.assertEqual(QuizStats.objects.get(quiz=quiz).attempts, 2)
+
+
+class ExportTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.quiz = make_quiz(2, exam_paper=True)
+        self.sittings = []
+        for username in ('first', 'second', 'third'):
+            user = User.objects.create_user(username, '', 'password')
+            sitting = Sitting.objects.new_sitting(user, self.quiz)
+            if username != 'third':
+                sitting.record_answers(
+                    responses(sitting, correct=False)[:1] +
+                    responses(sitting)[1:])
+                sitting.mark_quiz_complete()
+            self.sittings.append(sitting)
+        # archived, then deleted
+        self.archived = ArchivedSitting.from_sitting(self.sittings[1])
+        self.archived.save()
+        self.sittings[1].delete()
+
+    def export(self, format, compress=False):
+        return b''.join(export_results([self.quiz.id], format, compress,
+                                       chunk_size=1))
+
+    def test_csv(self):
+        lines = self.export('csv').decode('utf-8').splitlines()
+        rows = list(csv.reader(lines))
+        self.assertEqual(tuple(rows[0]), FIELDS)
+        # the archived sittings first, not the one in progress
+        self.assertEqual([int(row[0]) for row in rows[1:]],
+                         [self.archived.id, self.sittings[0].id])
+        sitting = self.sittings[0]
+        self.assertEqual(rows[2][1:8], [
+            str(self.quiz.id), str(sitting.user_id), 'first', '1', '2', '50',
+            str(sitting.question_ids[0])])
+        self.assertEqual(rows[2][8], sitting.completed.isoformat())
+
+    def test_jsonl(self):
+        rows = [json.loads(line) for line in
+                self.export('jsonl').decode('utf-8').splitlines()]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['username'], 'second')
+        self.assertEqual(rows[0]['score'], 1)
+        self.assertEqual(rows[0]['incorrect_questions'],
+                         [self.sittings[1].question_ids[0]])
+
+    def test_gzip(self):
+        self.assertEqual(
+            zlib.decompress(self.export('csv', True), 16 + zlib.MAX_WBITS),
+            self.export('csv'))
+
+
+class ImporterTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.quiz = make_quiz(1)
+        self.bank = [
+            {'content': 'What is 2 + 2?', 'category': 'Arithmetic',
+             'quizzes': [self.quiz.id],
+             'answers': [{'content': '4', 'correct': True},
+                         {'content': '5'}]},
+            {'content': 'What is 2 * 3?', 'category': 'Arithmetic',
+             'explanation': 'Count them.',
+             'answers': [{'content': '6', 'correct': True}]},
+            {'content': 'Which is a noble gas?', 'category': 'Chemistry',
+             'quizzes': [self.quiz.id],
+             'answers': [{'content': 'Argon', 'correct': True},
+                         {'content': 'Iron'}, {'content': 'Zinc'}]},
+        ]
+
+    def test_format_of(self):
+        self.assertEqual(importer.format_of('bank.JSON'), 'json')
+        self.assertEqual(importer.format_of('bank.yml'), 'yaml')
+        self.assertEqual(importer.format_of('bank.txt'), None)
+
+    def test_read_bank(self):
+        data = json.dumps(self.bank).encode('utf-8')
+        self.assertEqual(importer.read_bank(data, 'json'), self.bank)
+        self.assertRaises(ValidationError, importer.read_bank, b'[', 'json')
+        self.assertRaises(ValidationError, importer.read_bank, b'{}', 'json')
+        self.assertRaises(ValidationError, importer.read_bank, b'[]', 'xml')
+
+    def test_read_csv(self):
+        data = (u'content,category,quizzes,correct,answer_1,answer_2\n'
+                u'Caf\xe9?,Words,%d 5,2,No,Yes\n'
+                u',,,,,\n' % self.quiz.id).encode('utf-8')
+        questions = importer.read_bank(data, 'csv')
+        self.assertEqual(len(questions), 1)
+        self.assertEqual(questions[0]['content'], u'Caf\xe9?')
+        self.assertEqual(questions[0]['quizzes'], [str(self.quiz.id), '5'])
+        self.assertEqual(questions[0]['answers'], [
+            {'content': 'No', 'correct': False},
+            {'content': 'Yes', 'correct': True}])
+
+    @skipIf(importer.yaml is None, 'Importing YAML requires PyYAML')
+    def test_read_yaml(self):
+        data = b'- content: What?\n  answers:\n  - {content: A, correct: true}'
+        self.assertEqual(importer.read_bank(data, 'yaml'), [
+            {'content': 'What?',
+             'answers': [{'content': 'A', 'correct': True}]}])
+
+    def test_clean_bank(self):
+        bank = self.bank + [
+            {'content': 'No answer', 'answers': [{'content': 'A'}]},
+            {'content': 'Unknown quiz', 'quizzes': [self.quiz.id + 100],
+             'answers': [{'content': 'A', 'correct': True}]},
+        ]
+        try:
+            importer.clean_bank(bank)
+        except ValidationError as e:
+            self.assertEqual(e.messages, [
+                'Question 4: no correct answer',
+                'No quiz with the IDs %d' % (self.quiz.id + 100)])
+        else:
+            self.fail('The bank is not valid')
+
+    def test_import_bank(self):
+        Category.objects.create(name='Arithmetic')
+        counts = importer.import_bank(importer.clean_bank(self.bank),
+                                      batch_size=2)
+        self.assertEqual(counts, {'categories': 1, 'questions': 3,
+                                  'answers': 6, 'memberships': 2})
+        question = Question.objects.get(content='What is 2 * 3?')
+        self.assertEqual(question.explanation, 'Count them.')
+        self.assertEqual(question.category.name, 'Arithmetic')
+        self.assertEqual(list(question.answer_set.values_list(
+            'content', 'correct')), [('6', True)])
+        self.assertEqual(Quiz.objects.get(id=self.quiz.id).question_count,
+                         3)
+        self.assertEqual(len(get_quiz_content(self.quiz.id)
+                             .get_question_ids()), 3)
+
+    def test_dry_run(self):
+        questions = Question.objects.count()
+        counts = importer.import_bank(importer.clean_bank(self.bank),
+                                      dry_run=True)
+        self.assertEqual(counts['questions'], 3)
+        self.assertEqual(Question.objects.count(), questions)
+        self.assertFalse(Category.objects.filter(name='Chemistry').exists())
+
+
+class QuestionPageTest(TestCase):
+    urls = 'quiz.urls'
+
+    def setUp(self):
+        cache.clear()
+        setup_templates()
+        User.objects.create_user('user', 'user@example.com', 'password')
+        self.client.login(username='user', password='password')
+
+    def tearDown(self):
+        restore_template_loaders()
+
+    def assertPageQueries(self, quiz):
+        url = reverse('quiz_take', args=[quiz.id])
+        # starts the sitting and caches the content of the quiz
+        self.client.get(url)
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        sitting = Sitting.objects.get(quiz=quiz, active=True)
+        answer = Answer.objects.filter(
+            question_id=sitting.get_next_question())[0]
+        with self.assertNumQueries(4):
+            response = self.client.get(url, {'guess': answer.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Sitting.objects.get(pk=sitting.pk).cursor, 1)
+
+    def test_queries(self):
+        """
+        The number of queries of a question page does not depend on the
+        number of questions of the quiz
+        """
+        self.assertPageQueries(make_quiz(3, exam_paper=True))
+        self.assertPageQueries(make_quiz(300, exam_paper=True))
+
+    def test_reload(self):
+        """
+        Sending the answer to the previous question again records nothing
+        """
+        quiz = make_quiz(3, exam_paper=True)
+        url = reverse('quiz_take', args=[quiz.id])
+        self.client.get(url)
+        sitting = Sitting.objects.get(quiz=quiz, active=True)
+        answer = Answer.objects.filter(
+            question_id=sitting.get_next_question(), correct=True)[0]
+        self.client.get(url, {'guess': answer.id})
+        self.client.get(url, {'guess': answer.id})
+        sitting = Sitting.objects.get(pk=sitting.pk)
+        self.assertEqual(sitting.cursor, 1)
+        self.assertEqual(sitting.current_score, 1)
+
+        self.assertEqual(self.client.get(url, {'guess': 0}).status_code,
+                         404)
+
+
+class APITest(TestCase):
+    urls = 'quiz.urls'
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('user', 'user@example.com', 'password')
+        self.client.login(username='user', password='password')
+        self.quiz = make_quiz(3, exam_paper=True)
+
+    def get(self, name):
+        response = self.client.get(reverse(name, args=[self.quiz.id]))
+        return response.status_code, json.loads(
+            response.content.decode('utf-8'))
+
+    def post_answers(self, answers):
+        response = self.client.post(
+            reverse('quiz_api_answers', args=[self.quiz.id]),
+            json.dumps({'answers': [{'question': question_id,
+                                     'answer': answer_id}
+                                    for question_id, answer_id in answers]}),
+            content_type='application/json')
+        return response.status_code, json.loads(
+            response.content.decode('utf-8'))
+
+    def correct_answers(self, questions):
+        return [(question['id'], Answer.objects.get(
+            question_id=question['id'], correct=True).id)
+            for question in questions]
+
+    def test_take(self):
+        status, data = self.get('quiz_api_questions')
+        self.assertEqual(status, 200)
+        self.assertEqual(data['remaining'], 3)
+        questions = data['questions']
+        self.assertEqual(len(questions[0]['answers']), 3)
+
+        answers = self.correct_answers(questions)
+        status, data = self.post_answers(answers[:2])
+        self.assertEqual(status, 200)
+        self.assertEqual(data['recorded'], 2)
+        self.assertEqual(data['remaining'], 1)
+        # sent again after a lost response, then with the last one
+        status, data = self.post_answers(answers)
+        self.assertEqual(data['recorded'], 1)
+        self.assertEqual(data['result']['score'], 3)
+        self.assertTrue(data['result']['complete'])
+        self.assertEqual(self.get('quiz_api_result')[1]['percent'], 100)
+
+    def test_invalid_answers(self):
+        questions = self.get('quiz_api_questions')[1]['questions']
+        answers = self.correct_answers(questions)
+        # not the next question
+        self.assertEqual(self.post_answers(answers[1:2])[0], 409)
+        # the answer to another question
+        self.assertEqual(self.post_answers(
+            [(answers[0][0], answers[1][1])])[0], 400)
+        self.assertEqual(self.client.post(
+            reverse('quiz_api_answers', args=[self.quiz.id]), '{}',
+            content_type='application/json').status_code, 400)
+
+    def test_removed_question(self):
+        """
+        A question removed from the quiz since the sitting was started can
+        still be answered
+        """
+        questions = self.get('quiz_api_questions')[1]['questions']
+        answers = self.correct_answers(questions)
+        self.quiz.question_set.remove(questions[0]['id'])
+        bump_pending_versions(None)
+
+        questions = self.get('quiz_api_questions')[1]['questions']
+        self.assertEqual(questions[0]['id'], answers[0][0])
+        status, data = self.post_answers(answers[:1])
+        self.assertEqual(status, 200)
+        self.assertEqual(data['recorded'], 1)
+        self.assertTrue(data['answers'][0]['correct'])
+
+
+class KeysetPageTest(TestCase):
+    urls = 'quiz.urls'
+
+    def setUp(self):
+        cache.clear()
+        for name in ('Algebra', 'Biology', u'Caf\xe9s', 'Chemistry',
+                     'Geography'):
+            Category.objects.create(name=name)
+
+    def names(self, page):
+        return [category.name for category in page.items]
+
+    def test_pages(self):
+        categories = Category.objects.all()
+        page = KeysetPage(categories, ('name',), [], 2)
+        self.assertEqual(self.names(page), ['Algebra', 'Biology'])
+        self.assertTrue(page.has_next)
+        self.assertEqual(page.next_query, 'after=Biology')
+        self.assertEqual(page.count, 5)
+
+        page = KeysetPage(categories, ('name',), ['Chemistry'], 2)
+        self.assertEqual(self.names(page), ['Geography'])
+        self.assertFalse(page.has_next)
+
+        page = KeysetPage(categories, ('-name', 'id'), [], 1)
+        self.assertEqual(self.names(page), ['Geography'])
+
+    def test_search(self):
+        search = u'Caf\xe9'
+        page = KeysetPage(Category.objects.filter(name__contains=search),
+                          ('name',), [], 2, search)
+        self.assertEqual(self.names(page), [u'Caf\xe9s'])
+        self.assertEqual(page.count, 1)
+        self.assertEqual(KeysetPage(Category.objects.all(), ('name',), [],
+                                    2, search).count, 5)
+
+        User.objects.create_user('user', 'user@example.com', 'password')
+        self.client.login(username='user', password='password')
+        setup_templates()
+        try:
+            response = self.client.get(reverse('quiz_categories'),
+                                       {'q': search})
+        finally:
+            restore_template_loaders()
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '1 categories')
+
+
+class PackedQuestionOrderMigrationTest(TransactionTestCase):
+    """
+    The legacy comma separated lists of the sittings are converted to the
+    packed question order and back
+    """
+    before = [('quiz', '0001_initial')]
+    after = [('quiz', '0002_sitting_packed_question_order')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        executor.loader.build_graph()
+        return executor.loader.project_state(targets).render()
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_migration(self):
+        apps = self.migrate(self.before)
+        User = apps.get_model('auth', 'User')
+        Quiz = apps.get_model('quiz', 'Quiz')
+        Question = apps.get_model('quiz', 'Question')
+        Sitting = apps.get_model('quiz', 'Sitting')
+        user = User.objects.create(username='user')
+        quiz = Quiz.objects.create(title='Quiz')
+        questions = [Question.objects.create(content='Question %d' % i)
+                     for i in range(4)]
+        quiz.question_set.add(*questions)
+        ids = [question.id for question in questions]
+        # the first two questions answered, the second one incorrectly
+        sitting = Sitting.objects.create(
+            user=user, quiz=quiz, current_score=1,
+            question_list='%d,%d,' % (ids[2], ids[3]),
+            incorrect_questions='%d,' % ids[1])
+
+        apps = self.migrate(self.after)
+        Sitting = apps.get_model('quiz', 'Sitting')
+        migrated = Sitting.objects.get(pk=sitting.pk)
+        order = unpack_ids(migrated.question_order)
+        self.assertEqual(order, (ids[1], ids[0], ids[2], ids[3]))
+        self.assertEqual(migrated.cursor, 2)
+        self.assertEqual(bitset_indexes(migrated.incorrect_bitset), [0])
+
+        apps = self.migrate(self.before)
+        Sitting = apps.get_model('quiz', 'Sitting')
+        restored = Sitting.objects.get(pk=sitting.pk)
+        self.assertEqual(restored.question_list, sitting.question_list)
+        self.assertEqual(restored.incorrect_questions,
+                         sitting.incorrect_questions)
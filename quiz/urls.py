@@ -13,4 +13,22 @@ urlpatterns = patterns(
 
     url(r'^take/(?P<quiz_id>\d+)/$', 'quiz_take',
         name='quiz_take'),
+
+    url(r'^progress/$', 'progress',
+        name='quiz_progress'),
+
+    url(r'^history/$', 'exam_history',
+        name='quiz_history'),
+)
+
+urlpatterns += patterns(
+    'quiz.api',
+    url(r'^api/take/(?P<quiz_id>\d+)/questions/$', 'questions',
+        name='quiz_api_questions'),
+
+    url(r'^api/take/(?P<quiz_id>\d+)/answers/$', 'answers',
+        name='quiz_api_answers'),
+
+    url(r'^api/take/(?P<quiz_id>\d+)/result/$', 'result',
+        name='quiz_api_result'),
 )
@@ -1,61 +1,89 @@
 # -*- coding: utf-8 -*-
 # import random
+from datetime import datetime
+
 from django.shortcuts import render_to_response
 from django.template import RequestContext
 from django.shortcuts import render, get_object_or_404
-from quiz.models import Category, Quiz, Sitting, Question, Answer
+from django.http import Http404
+from django.db import transaction
+from django.views.decorators.http import condition
+from quiz.models import Category, Quiz, Sitting, Answer, CategoryProgress, \
+    QuizStats
+from quiz.content import get_quiz_content, get_catalogue_version
+from quiz.buffer import load_buffered_answers, save_answers, flush_sitting
+from quiz.pagination import KeysetPage
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 
+# number of categories or quizzes per page of the listings
+PAGE_SIZE = getattr(settings, 'QUIZ_PAGE_SIZE', 50)
+# whether the sittings of the quizzes which are not exam papers are left
+# for quiz_archive_sittings to delete, instead of being deleted at once
+DEFER_SITTING_DELETION = getattr(settings, 'QUIZ_DEFER_SITTING_DELETION',
+                                 False)
+
+
+def catalogue_etag(request, *args, **kwargs):
+    """
+    The pages listing the categories and quizzes only change with the
+    catalogue. They extend the site's base template, hence the user.
+    """
+    return '%s-%s' % (get_catalogue_version(), request.user.pk)
+
+
+def catalogue_last_modified(request, *args, **kwargs):
+    return datetime.utcfromtimestamp(get_catalogue_version() / 1000.0)
+
 
 @login_required
+@condition(etag_func=catalogue_etag,
+           last_modified_func=catalogue_last_modified)
 def index(request):
+    search = request.GET.get('q', '')
+    categories = Category.objects.only('id', 'name')
+    if search:
+        categories = categories.filter(name__icontains=search)
+    page = KeysetPage(categories, ('name',), request.GET.getlist('after'),
+                      PAGE_SIZE, search)
+    # the page is cached in the template as long as the version is current
     return render(request, 'quiz/quiz_categories.html', {
-        'categories': Category.objects.all(),
+        'page': page,
+        'search': search,
+        'catalogue_version': get_catalogue_version(),
     })
 
 
 @login_required
+@condition(etag_func=catalogue_etag,
+           last_modified_func=catalogue_last_modified)
 def view_category(request, category_id):
-    category = get_object_or_404(Category, id=category_id)
-    quizzes = Quiz.objects.filter(category=category)
+    category = get_object_or_404(Category.objects.only('id', 'name'),
+                                 id=category_id)
+    search = request.GET.get('q', '')
+    quizzes = Quiz.objects.filter(category=category).only('id', 'title')
+    if search:
+        quizzes = quizzes.filter(title__icontains=search)
+    page = KeysetPage(quizzes, ('title', 'id'), request.GET.getlist('after'),
+                      PAGE_SIZE, search)
     return render(request, 'quiz/quiz_category.html', {
         'category': category,
-        'quizzes': quizzes})
+        'page': page,
+        'search': search,
+        'catalogue_version': get_catalogue_version()})
 
 
 @login_required
 def quiz_take(request, quiz_id):
-    # TODO:
-    #   * Can there really be more than one sitting? Is that good?
-    #   * If there can be several, use filter immediately.
-    #   * If there can be only one, use get and do not catch
-    #     Sitting.MultipleObjectsReturned since it will never occur
-
-    quiz = Quiz.objects.get(id=quiz_id)
-
     try:
-        previous_sitting = Sitting.objects.get(
-            user=request.user,
-            quiz=quiz,
-            complete=False)
+        quiz = get_quiz_content(quiz_id)
+    except Quiz.DoesNotExist:
+        raise Http404
 
-    except Sitting.DoesNotExist:
-        #  start new quiz
-        sitting = Sitting.objects.new_sitting(request.user, quiz)
-        return load_next_question(request, sitting, quiz)
-
-    except Sitting.MultipleObjectsReturned:
-        #  if more than one sitting found
-        previous_sitting = Sitting.objects.filter(
-            user=request.user,
-            quiz=quiz,
-            complete=False)[0]  # use the first one
-
-        return load_next_question(request, previous_sitting, quiz)
-
-    else:
-        #  use existing quiz
-        return load_next_question(request, previous_sitting, quiz)
+    #  use the existing sitting or start a new one
+    sitting = Sitting.objects.get_or_create_sitting(request.user, quiz)
+    load_buffered_answers(sitting)
+    return load_next_question(request, sitting, quiz)
 
 
 @login_required
@@ -63,25 +91,27 @@ def load_next_question(request, sitting, quiz):
     """
     Load the next question, including outcome of
     previous question, using the sitting
+    quiz is the cached content of the quiz, see quiz.content
     """
     previous = {}
 
     if 'guess' in request.GET and request.GET['guess']:
         #  if there has been a previous question
         #  returns a dictionary with previous question details
+        #  and moves the sitting on to the next question
         previous = question_check(request, quiz, sitting)
-        sitting.remove_first_question()  # remove the first question
 
     question_ID = sitting.get_next_question()
 
     if not question_ID:
         #  no questions left
-        return final_result(request, sitting, previous)
+        return final_result(request, sitting, quiz, previous)
 
-    next_question = Question.objects.get(id=question_ID)
+    next_question = quiz.get_question(question_ID)
 
     return render_to_response('quiz/question.html',
                               {'quiz': quiz,
+                               'sitting': sitting,
                                'question': next_question,
                                'previous': previous,
                                },
@@ -92,21 +122,41 @@ def load_next_question(request, sitting, quiz):
 @login_required
 def question_check(request, quiz, sitting):
     """
-    Check if a question is correct, adds to score if needed
+    Check if a question is correct, records the answer in the sitting
     and return the previous questions details
     """
-    # quiz_id = str(quiz.id)
     guess = request.GET['guess']  # id of the guessed answer
-    answer = Answer.objects.get(id=guess)
-    # question object (only question related to an answer)
-    question = answer.question
+    try:
+        guess = int(guess)
+    except ValueError:
+        raise Http404
+
+    answer = quiz.get_answer(guess)
+    if answer is not None:
+        question = quiz.get_question(answer.question_id)
+    else:
+        # not an answer of the quiz as it is now
+        try:
+            answer = Answer.objects.select_related('question').get(id=guess)
+        except Answer.DoesNotExist:
+            raise Http404
+        question = answer.question
+
+    if answer.question_id != sitting.get_next_question():
+        # not an answer to the question under the cursor, e.g. the answer
+        # to the previous question sent again by reloading the page
+        return {}
+
+    # adds 1 to the sitting score or flags the question as incorrect,
+    # and removes the question from the list, in one write or buffered
+    if not save_answers(sitting, [answer]):
+        # answered by a concurrent request
+        return {}
 
     if answer.correct:
         outcome = "correct"
-        sitting.add_to_score(1)  # add 1 to sitting score.
     else:
         outcome = "incorrect"
-        sitting.add_incorrect_question(question)
 
     if not quiz.answers_at_end:  # display answer after each question
         return {'previous_answer': answer,
@@ -116,20 +166,59 @@ def question_check(request, quiz, sitting):
 
 
 @login_required
-def final_result(request, sitting, previous):
+def progress(request):
+    """
+    The score of the user in each category, over all the quizzes taken
+    """
+    progress = CategoryProgress.objects.filter(user=request.user) \
+        .select_related('category').order_by('category__name')
+    return render(request, 'quiz/progress.html', {'progress': progress})
+
+
+@login_required
+def exam_history(request):
+    """
+    The exam papers completed by the user, most recent first
+    """
+    exams = Sitting.objects.filter(user=request.user, complete=True) \
+        .select_related('quiz') \
+        .only('id', 'current_score', 'max_score', 'completed', 'quiz__title')
+    page = KeysetPage(exams, ('-completed', '-id'),
+                      request.GET.getlist('after'), PAGE_SIZE)
+    return render(request, 'quiz/history.html', {'page': page})
+
+
+def complete_sitting(sitting, quiz):
+    """
+    Called once all the questions of the sitting have been answered.
+    Of the requests completing the same sitting at once, only the one
+    which ends it records its responses, progress and result.
+    """
+    flush_sitting(sitting)
+    with transaction.atomic():
+        if quiz.exam_paper:
+            ended = sitting.mark_quiz_complete()  # mark as complete
+        else:
+            ended = sitting.mark_quiz_finished()
+        if ended:
+            CategoryProgress.objects.record_sitting(sitting, quiz)
+            QuizStats.objects.record(quiz.id, sitting.get_percent_correct())
+    # unless deleted in bulk by quiz_archive_sittings
+    if ended and not quiz.exam_paper and not DEFER_SITTING_DELETION:
+        # if we do not plan to store the outcome
+        sitting.delete()  # delete the sitting to free up DB space
+
+
+@login_required
+def final_result(request, sitting, quiz, previous):
     """
     The result page for a logged in user
     """
-    quiz = sitting.quiz
     score = sitting.get_current_score()
-    incorrect = sitting.get_incorrect_questions()
-    max_score = quiz.question_set.all().count()
+    max_score = sitting.max_score
     percent = sitting.get_percent_correct()
 
-    sitting.mark_quiz_complete()  # mark as complete
-
-    if not quiz.exam_paper:  # if we do not plan to store the outcome
-        sitting.delete()  # delete the sitting to free up DB space
+    complete_sitting(sitting, quiz)
 
     if not quiz.answers_at_end:  # answer was shown after each question
         return render_to_response('quiz/result.html', {
@@ -140,12 +229,11 @@ def final_result(request, sitting, previous):
             'previous': previous},
             context_instance=RequestContext(request))
     else:  # show all questions and answers
-        questions = quiz.question_set.all()
+        results = sitting.get_question_results()
         return render_to_response('quiz/result.html', {
             'quiz': quiz,
             'score': score,
             'max_score': max_score,
             'percent': percent,
-            'questions': questions,
-            'incorrect_questions': incorrect},
+            'questions': results},
             context_instance=RequestContext(request))
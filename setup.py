@@ -19,4 +19,10 @@ setup(
     description='Quiz app for Django',
     long_description=readme,
     zip_safe=False,
+    extras_require={
+        # quiz_item_analysis
+        'analysis': ['numpy'],
+        # YAML question banks
+        'yaml': ['PyYAML'],
+    },
 )